@@ -0,0 +1,25 @@
+"""
+CPU budget of the current process.
+
+Shared by the gunicorn configuration (worker count) and the settings
+(render pool size), which must not import each other.
+"""
+import math
+import multiprocessing
+import os
+
+
+def available_cpus():
+    """CPUs this process may use: the cgroup quota if set, else the affinity mask"""
+    # Containers usually report the host's core count to cpu_count()
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        if quota != 'max':
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
@@ -0,0 +1,86 @@
+"""
+Gunicorn configuration for anonymous_msg.
+
+Used by start.sh as ``gunicorn --config python:anonymous_msg.gunicorn_conf``.
+Every value can be overridden from the environment:
+
+    PORT                 port to bind (default 8000)
+    ASGI                 1 serves anonymous_msg.asgi with uvicorn workers
+    WEB_CONCURRENCY      worker processes (default: one per CPU, at most
+                         MAX_DEFAULT_WORKERS)
+    GUNICORN_THREADS     threads per sync worker (gthread when > 1)
+    GUNICORN_PRELOAD     0 disables preloading the app in the master
+    GUNICORN_TIMEOUT     worker timeout in seconds
+"""
+import os
+from anonymous_msg.cpus import available_cpus
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'anonymous_msg.settings')
+
+# Every worker thread holds its own database connection, so the default
+# stays well below what a connection pooler allows even on large hosts
+MAX_DEFAULT_WORKERS = 4
+
+CPU_COUNT = available_cpus()
+ASGI = os.environ.get('ASGI', '0') == '1'
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+if ASGI:
+    wsgi_app = 'anonymous_msg.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    # One event loop per core handles any number of concurrent requests
+    workers = int(os.environ.get('WEB_CONCURRENCY', min(CPU_COUNT, MAX_DEFAULT_WORKERS)))
+    threads = 1
+else:
+    wsgi_app = 'anonymous_msg.wsgi:application'
+    # Requests mostly wait on the database, so a few threads per process
+    # keep cores busy without multiplying the memory of whole processes;
+    # by default at most 4 workers x 4 threads = 16 database connections
+    workers = int(os.environ.get('WEB_CONCURRENCY', max(2, min(CPU_COUNT, MAX_DEFAULT_WORKERS))))
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+    worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Load Django once in the master; workers fork with it already set up
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+loglevel = 'info'
+accesslog = '-'
+
+
+def when_ready(server):
+    """Master: warm the fork-safe state once so every worker inherits it"""
+    # Only runs after preloading; it opens no database connection, so no
+    # socket is ever shared between forked workers
+    if preload_app:
+        from messaging.warmup import warm_up_process
+        warm_up_process()
+        server.log.info('Warmed up application in master before forking workers')
+
+
+def post_worker_init(worker):
+    """Worker: finish warming up before the first request is accepted"""
+    from messaging.warmup import warm_up_worker, warm_up_request, warm_up_thread_pool
+    warm_up_worker()
+    if not ASGI:
+        warm_up_request(worker.wsgi)
+
+    # gthread workers serve requests from their own thread pool, and Django
+    # connections are per thread: connect those threads, not this one
+    thread_pool = getattr(worker, 'tpool', None)
+    if thread_pool is not None:
+        try:
+            warm_up_thread_pool(thread_pool, threads)
+        except Exception as exc:
+            worker.log.warning('Could not connect the request threads ahead of time: %s', exc)
+    worker.log.info('Worker %s warmed up', worker.pid)
+
+
+def worker_exit(server, worker):
+    """Worker: stop the share card render processes it may have started"""
+    from messaging.exports import shutdown_render_pool
+    shutdown_render_pool()
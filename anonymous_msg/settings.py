@@ -2,8 +2,11 @@
 Django settings for anonymous_msg project.
 """
 
+from django.core.exceptions import ImproperlyConfigured
 from pathlib import Path
+from .cpus import available_cpus
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -34,6 +37,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'messaging.middleware.SessionRefreshMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -129,7 +133,10 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Rate limiting settings
 RATELIMIT_ENABLE = True
-RATELIMIT_USE_CACHE = 'default'
+# Sliding-window counters shared by all workers on the host (messaging.ratelimit)
+RATELIMIT_STORE_PATH = os.environ.get(
+    'RATELIMIT_STORE_PATH', os.path.join(tempfile.gettempdir(), 'anonymous_msg_ratelimit.sqlite3')
+)
 
 # Cache configuration
 CACHES = {
@@ -139,6 +146,107 @@ CACHES = {
     }
 }
 
+# PIN brute-force protection: consecutive failures per username and per
+# client IP before a lockout, the first lockout (doubled on every further
+# failure, up to the maximum) and the quiet time after which failures reset
+AUTH_LOCKOUT_STORE_PATH = os.environ.get(
+    'AUTH_LOCKOUT_STORE_PATH', os.path.join(tempfile.gettempdir(), 'anonymous_msg_lockout.sqlite3')
+)
+AUTH_LOCKOUT_THRESHOLDS = {'username': 5, 'ip': 20}
+AUTH_LOCKOUT_BASE_SECONDS = 30
+AUTH_LOCKOUT_MAX_SECONDS = 900
+AUTH_LOCKOUT_RESET_AFTER = 3600
+
+# Seconds a worker may serve its in-memory blocklist before re-reading it
+BLOCKLIST_MAX_AGE = 10
+
+# Seconds a worker may use its compiled spam word matcher before rebuilding it
+SPAM_WORDS_MAX_AGE = 60
+
+# Near-duplicate flood detection per recipient
+FLOOD_WINDOW_SIZE = 50  # signatures kept per recipient
+FLOOD_WINDOW_SECONDS = 600
+FLOOD_SIMILARITY_THRESHOLD = 0.8  # estimated Jaccard similarity
+FLOOD_DUPLICATE_LIMIT = 3  # near-duplicates allowed inside the window
+# Signature windows shared by all workers on the host (messaging.flood)
+FLOOD_STORE_PATH = os.environ.get(
+    'FLOOD_STORE_PATH', os.path.join(tempfile.gettempdir(), 'anonymous_msg_flood.sqlite3')
+)
+
+# Message ingestion: 'sync' writes each message immediately, 'queued' acknowledges
+# senders after a durable local journal write and inserts in batches
+MESSAGE_INGESTION_MODE = os.environ.get('MESSAGE_INGESTION_MODE', 'sync')
+MESSAGE_QUEUE_PATH = os.environ.get(
+    'MESSAGE_QUEUE_PATH', os.path.join(tempfile.gettempdir(), 'anonymous_msg_queue.sqlite3')
+)
+MESSAGE_QUEUE_BATCH_SIZE = 200
+MESSAGE_QUEUE_MAX_DELAY = 2  # seconds before a partial batch is flushed
+MESSAGE_QUEUE_CLAIM_TIMEOUT = 60  # seconds before a crashed flusher's batch is retried
+
+# Username -> profile lookup cache (seconds)
+PROFILE_CACHE_TIMEOUT = 60
+PROFILE_NEGATIVE_CACHE_TIMEOUT = 10
+
+# Per-worker Bloom filter of taken usernames behind the availability check:
+# seconds between reads of newly created profiles, seconds before a full
+# rebuild, and the false positive rate it is sized for
+USERNAME_FILTER_REFRESH = 5
+USERNAME_FILTER_MAX_AGE = 3600
+USERNAME_FILTER_ERROR_RATE = 0.01
+
+# Seconds the rendered public profile page is cached (also the CDN s-maxage)
+PUBLIC_PROFILE_CACHE_TIMEOUT = 300
+
+# Deleting a whole inbox: rows per DELETE, and the inbox size above which
+# the deletion runs in a background thread while the dashboard polls it
+BULK_DELETE_CHUNK_SIZE = 1000
+BULK_DELETE_BACKGROUND_THRESHOLD = 5000
+BULK_DELETE_STALE_AFTER = 60  # seconds without progress before a job is taken over
+
+# Messages older than this many days are moved to the compressed archive by
+# the archive_messages command, in per-profile batches of this many messages
+MESSAGE_RETENTION_DAYS = int(os.environ.get('MESSAGE_RETENTION_DAYS', 90))
+MESSAGE_ARCHIVE_BATCH_SIZE = 500
+
+# Serve the public profile and send endpoints with their async views.
+# anonymous_msg.asgi turns this on; sync WSGI workers keep the sync views.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') == '1'
+
+# Live dashboard updates (server-sent events under ASGI)
+LIVE_UPDATES_POLL_INTERVAL = 2  # seconds between change checks, per process
+LIVE_UPDATES_HEARTBEAT = 15
+LIVE_UPDATES_STREAM_TIMEOUT = 120  # streams end and EventSource reconnects; also bounds a closed tab's stream
+
 # Session settings
+# Sessions only hold the dashboard auth flags and the one-time PIN notice.
+# 'db' keeps them server-side (logout revokes them, expired rows are
+# removed by the prune_sessions command); 'signed_cookies' needs no storage
+# at all, but a copied cookie stays valid until it expires. 'cached_db' needs
+# a cache shared by every worker: with the per-process LocMemCache each
+# worker would keep accepting a session that was logged out on another.
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.db')
+if (SESSION_ENGINE == 'django.contrib.sessions.backends.cached_db'
+        and CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache'):
+    raise ImproperlyConfigured('The cached_db session engine needs a cache shared by all workers.')
 SESSION_COOKIE_AGE = 86400  # 24 hours
-SESSION_SAVE_EVERY_REQUEST = True
+# Saving on every request wrote a session row for every hit that carried a
+# cookie; SessionRefreshMiddleware keeps expiry sliding instead
+SESSION_SAVE_EVERY_REQUEST = False
+SESSION_REFRESH_INTERVAL = 3600  # seconds between expiry refreshes of a used session
+
+# Share image cache (rendered PNGs, shared by all workers on the host)
+SHARE_IMAGE_CACHE_DIR = os.environ.get(
+    'SHARE_IMAGE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'anonymous_msg_share_images')
+)
+SHARE_IMAGE_CACHE_MAX_BYTES = int(os.environ.get('SHARE_IMAGE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Processes used to render share cards for the bulk image export, per web
+# worker: one per CPU in the container's quota, never more than the cap
+SHARE_IMAGE_EXPORT_MAX_WORKERS = 4
+SHARE_IMAGE_EXPORT_WORKERS = min(
+    int(os.environ.get('SHARE_IMAGE_EXPORT_WORKERS', available_cpus())),
+    SHARE_IMAGE_EXPORT_MAX_WORKERS,
+)
+
+# Rows fetched per query by the streaming CSV / JSON Lines inbox export
+MESSAGE_EXPORT_CHUNK_SIZE = 2000
@@ -1,32 +1,188 @@
+from django import forms
 from django.contrib import admin
-from .models import UserProfile, Message, BlockedIP
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections, router
+from django.db.models import F
+from django.utils.functional import cached_property
+from .models import UserProfile, Message, BlockedIP, SpamWord, InboxDeletion, MessageArchive
+import ipaddress
+
+
+# Above this many rows an unfiltered changelist shows the planner's row
+# estimate instead of running an exact COUNT(*) over the whole table
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+def estimated_row_count(model):
+    """The database's own estimate of a table's row count, or None if it has none"""
+    connection = connections[router.db_for_read(model)]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Maintained by VACUUM and ANALYZE; -1 until the table was first analyzed
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            # Written by ANALYZE; the first number of a stat is the table's row count
+            cursor.execute("SELECT name FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that takes the row estimate for large unfiltered changelists"""
+    
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimated_row_count(self.object_list.model)
+            if estimate is not None and estimate >= ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class UsernamePrefixSearchMixin:
+    """
+    Search by username prefix only.
+    
+    Usernames are stored lowercase, so the term is lowercased and matched
+    with a case-sensitive LIKE 'term%'. On PostgreSQL that is served by the
+    varchar_pattern_ops index Django creates for the unique username column;
+    the admin's default icontains would scan every row.
+    """
+    username_lookup = 'username'
+    search_help_text = 'Search by username prefix'
+    
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip().lower()
+        if not term:
+            return queryset, False
+        return queryset.filter(**{f'{self.username_lookup}__startswith': term}), False
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(UsernamePrefixSearchMixin, admin.ModelAdmin):
     list_display = ['username', 'pin', 'created_at', 'message_count']
     search_fields = ['username']
     readonly_fields = ['created_at']
+    # Served by the primary key, where -created_at would sort the whole table
+    ordering = ['-id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        # The maintained counter, joined in the same query as the page;
+        # empty until the profile's stats are first computed
+        return super().get_queryset(request).annotate(message_count=F('stats__total_messages'))
     
     def message_count(self, obj):
-        return obj.messages.count()
+        return obj.message_count
     message_count.short_description = 'Messages'
+    message_count.admin_order_field = 'message_count'
 
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(UsernamePrefixSearchMixin, admin.ModelAdmin):
     list_display = ['user', 'message_preview', 'status', 'timestamp']
     list_filter = ['status', 'timestamp']
-    search_fields = ['user__username', 'message_text']
+    list_select_related = ['user']
+    # Searching message_text was an unindexed ILIKE '%...%' over every message
+    search_fields = ['user__username']
+    username_lookup = 'user__username'
     readonly_fields = ['timestamp', 'sender_ip_hash']
+    # Newest first through the primary key; no index covers -timestamp alone
+    ordering = ['-id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     def message_preview(self, obj):
         return obj.message_text[:50] + '...' if len(obj.message_text) > 50 else obj.message_text
     message_preview.short_description = 'Message'
 
 
+class BlockedIPAdminForm(forms.ModelForm):
+    """Block an address or network; only its hash is stored"""
+    address = forms.CharField(
+        required=False,
+        help_text='IP address (e.g. 203.0.113.7) or network (e.g. 203.0.113.0/24, 2001:db8::/64). '
+                  'Leave blank to keep the existing hash.'
+    )
+    
+    class Meta:
+        model = BlockedIP
+        fields = ['address', 'reason']
+    
+    def clean_address(self):
+        address = self.cleaned_data['address'].strip()
+        if not address:
+            if not self.instance.pk:
+                raise ValidationError('Enter an IP address or network to block.')
+            return address
+        
+        if '/' not in address:
+            try:
+                ipaddress.ip_address(address)
+            except ValueError:
+                raise ValidationError('Enter a valid IP address.')
+            return address
+        
+        try:
+            network = ipaddress.ip_network(address, strict=False)
+        except ValueError:
+            raise ValidationError('Enter a valid network, e.g. 203.0.113.0/24.')
+        
+        allowed = BlockedIP.PREFIX_LENGTHS[network.version]
+        if network.prefixlen not in allowed:
+            raise ValidationError(
+                f"IPv{network.version} networks can be blocked at /{' or /'.join(map(str, allowed))}."
+            )
+        return address
+    
+    def save(self, commit=True):
+        address = self.cleaned_data.get('address')
+        if address:
+            if '/' in address:
+                network = ipaddress.ip_network(address, strict=False)
+                self.instance.ip_hash = BlockedIP.hash_network(network)
+                self.instance.prefix_length = network.prefixlen
+            else:
+                self.instance.ip_hash = BlockedIP.hash_address(address)
+                self.instance.prefix_length = None
+        return super().save(commit)
+
+
 @admin.register(BlockedIP)
 class BlockedIPAdmin(admin.ModelAdmin):
-    list_display = ['ip_hash', 'reason', 'blocked_at']
-    list_filter = ['blocked_at']
-    readonly_fields = ['blocked_at']
+    form = BlockedIPAdminForm
+    list_display = ['ip_hash', 'prefix_length', 'reason', 'blocked_at']
+    list_filter = ['prefix_length', 'blocked_at']
+    readonly_fields = ['ip_hash', 'prefix_length', 'blocked_at']
+
+
+@admin.register(SpamWord)
+class SpamWordAdmin(admin.ModelAdmin):
+    list_display = ['word', 'created_at']
+    search_fields = ['word']
+    readonly_fields = ['created_at']
+
+
+@admin.register(InboxDeletion)
+class InboxDeletionAdmin(admin.ModelAdmin):
+    list_display = ['user', 'status', 'deleted_messages', 'total_messages', 'created_at', 'updated_at']
+    list_filter = ['status']
+    readonly_fields = ['user', 'up_to_id', 'total_messages', 'deleted_messages', 'created_at', 'updated_at']
+
+
+@admin.register(MessageArchive)
+class MessageArchiveAdmin(admin.ModelAdmin):
+    list_display = ['user', 'message_count', 'first_timestamp', 'last_timestamp', 'created_at']
+    search_fields = ['user__username']
+    # The compressed blob is not editable; it is read through messaging.archive
+    exclude = ['data']
+    readonly_fields = ['user', 'message_count', 'first_timestamp', 'last_timestamp', 'created_at']
@@ -0,0 +1,176 @@
+"""
+Cold archive for old messages.
+
+Messages older than MESSAGE_RETENTION_DAYS are moved out of the Message
+table into MessageArchive rows: per-profile batches of up to
+MESSAGE_ARCHIVE_BATCH_SIZE messages, stored as one zlib-compressed JSON
+blob each. The inbox table, its indexes and the stats scans then only
+cover recent messages, while the archive stays readable from the dashboard
+by decompressing a batch at a time.
+
+Each batch is written and its messages deleted in the same transaction, so
+an interrupted run never loses or duplicates a message. A batch left
+partly filled by the previous run is topped up before a new one is started.
+"""
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from datetime import timedelta
+import json
+import zlib
+from .deletion import delete_message_rows
+from .models import UserProfile, Message, MessageArchive
+from .pagination import EPOCH, MESSAGES_PAGE_SIZE, iter_by_id
+from .stats import recompute_stats
+
+
+# Fields stored per archived message, in this order
+ARCHIVE_FIELDS = ('id', 'timestamp', 'status', 'sender_ip_hash', 'message_text')
+
+
+def _to_micros(timestamp):
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+
+def pack_rows(rows):
+    """Compress archive rows (lists in ARCHIVE_FIELDS order) into a blob"""
+    return zlib.compress(json.dumps(rows, separators=(',', ':')).encode(), 9)
+
+
+def unpack_rows(data):
+    """Decompress a blob back into its rows, oldest first"""
+    return json.loads(zlib.decompress(bytes(data)))
+
+
+def unpack_messages(archive):
+    """The messages of a batch as unsaved Message instances, oldest first"""
+    return [
+        Message(
+            id=message_id,
+            user_id=archive.user_id,
+            timestamp=EPOCH + timedelta(microseconds=micros),
+            status=status,
+            sender_ip_hash=sender_ip_hash,
+            message_text=message_text,
+        )
+        for message_id, micros, status, sender_ip_hash, message_text in unpack_rows(archive.data)
+    ]
+
+
+def archive_user_messages(user_profile, cutoff, batch_size=None):
+    """
+    Move a profile's messages older than cutoff into the archive.
+
+    Returns the number of messages archived.
+    """
+    batch_size = batch_size or settings.MESSAGE_ARCHIVE_BATCH_SIZE
+    # Oldest first, served by message_user_timestamp_idx read backwards
+    old_messages = (
+        user_profile.messages.filter(timestamp__lt=cutoff)
+        .order_by('timestamp', 'id').values_list(*ARCHIVE_FIELDS)
+    )
+    using = router.db_for_write(Message)
+    total = 0
+
+    while True:
+        with transaction.atomic(using=using):
+            archive = user_profile.message_archives.select_for_update().first()
+            if archive is not None and archive.message_count < batch_size:
+                rows = unpack_rows(archive.data)
+            else:
+                archive = MessageArchive(user=user_profile)
+                rows = []
+
+            batch = list(old_messages[:batch_size - len(rows)])
+            if not batch:
+                break
+
+            rows.extend([message_id, _to_micros(timestamp), *rest] for message_id, timestamp, *rest in batch)
+            rows.sort(key=lambda row: (row[1], row[0]))
+
+            archive.data = pack_rows(rows)
+            archive.message_count = len(rows)
+            archive.first_timestamp = EPOCH + timedelta(microseconds=rows[0][1])
+            archive.last_timestamp = EPOCH + timedelta(microseconds=rows[-1][1])
+            archive.save()
+
+            delete_message_rows(Message.objects.filter(id__in=[row[0] for row in batch]))
+            total += len(batch)
+
+    if total:
+        recompute_stats(user_profile)
+    return total
+
+
+def archive_old_messages(days=None, batch_size=None, profiles=None, progress=None):
+    """
+    Archive every profile's messages older than the retention period.
+
+    Calls progress(user_profile, archived) for each profile that had old
+    messages and returns the total number of messages archived.
+    """
+    days = settings.MESSAGE_RETENTION_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    if profiles is None:
+        profiles = iter_by_id(UserProfile.objects.all())
+
+    total = 0
+    for user_profile in profiles:
+        archived = archive_user_messages(user_profile, cutoff, batch_size)
+        if archived and progress is not None:
+            progress(user_profile, archived)
+        total += archived
+    return total
+
+
+def count_archived_messages(user_profile):
+    """Number of messages a profile has in the archive"""
+    return user_profile.message_archives.aggregate(total=Sum('message_count'))['total'] or 0
+
+
+def encode_archive_cursor(archive_id, remaining):
+    """Encode an archive position as an opaque '<archive id>-<messages left in it>' cursor"""
+    return f"{archive_id}-{remaining}"
+
+
+def decode_archive_cursor(cursor):
+    """Decode an archive cursor into an (archive id, remaining) tuple, or None if malformed"""
+    try:
+        archive_id, remaining = cursor.split('-', 1)
+        archive_id, remaining = int(archive_id), int(remaining)
+    except (AttributeError, ValueError):
+        return None
+    if remaining < 0:
+        return None
+    return archive_id, remaining
+
+
+def get_archive_page(user_profile, before=None, page_size=MESSAGES_PAGE_SIZE):
+    """
+    Fetch one slice of a profile's archived messages, newest first.
+
+    Only the batches the slice spans are read and decompressed. The cursor
+    counts messages from the oldest end of a batch, so a batch topped up
+    by a later archive run does not shift it. Returns a tuple of
+    (messages, next_cursor); next_cursor is None on the last page.
+    """
+    archives = user_profile.message_archives.all()
+    before_id = None
+    if before is not None:
+        before_id, remaining = before
+        archives = archives.filter(id__lte=before_id)
+
+    messages_list = []
+    for archive in iter_by_id(archives, chunk_size=2, descending=True):
+        archived = unpack_messages(archive)
+        end = min(remaining, len(archived)) if archive.id == before_id else len(archived)
+        start = max(0, end - (page_size - len(messages_list)))
+        messages_list.extend(reversed(archived[start:end]))
+
+        if len(messages_list) == page_size:
+            if start > 0 or user_profile.message_archives.filter(id__lt=archive.id).exists():
+                return messages_list, encode_archive_cursor(archive.id, start)
+            return messages_list, None
+
+    return messages_list, None
@@ -0,0 +1,184 @@
+"""
+Username availability without a query per keystroke.
+
+Each worker keeps a Bloom filter of every taken username. A name the
+filter does not contain is definitely free and needs no query; only names
+it may contain (taken, or the rare false positive) are confirmed against
+the database.
+
+The filter is built once, then caught up every USERNAME_FILTER_REFRESH
+seconds with the profiles created since (one indexed query on id, however
+many checks were served), and names created by this worker are added
+right away. Deleted names stay in the filter and are simply confirmed as
+free, until the full rebuild every USERNAME_FILTER_MAX_AGE seconds, which
+also resizes the filter as the profile table grows. A name taken by
+another worker within the refresh interval can be reported free; the
+unique constraint still rejects it when the profile is created.
+"""
+from django.conf import settings
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from .models import UserProfile
+from .pagination import iter_by_id
+
+
+USERNAME_PATTERN = re.compile(r'^[a-z0-9_]+$')
+USERNAME_MIN_LENGTH = 3
+USERNAME_MAX_LENGTH = 50
+
+# Smallest filter built, so a young site does not rebuild on every signup
+MIN_FILTER_CAPACITY = 10000
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing on one BLAKE2b digest)"""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class _Snapshot:
+    """One worker's filter and how far into the profile table it has read"""
+
+    def __init__(self, bloom, max_id, built_at):
+        self.bloom = bloom
+        self.max_id = max_id
+        self.built_at = built_at
+        self.refreshed_at = built_at
+
+
+_snapshot = None
+_reload_lock = threading.Lock()
+
+
+def _add_profiles(snapshot, profiles):
+    for profile_id, username in profiles:
+        snapshot.bloom.add(username)
+        snapshot.max_id = max(snapshot.max_id, profile_id)
+
+
+def _build_snapshot():
+    capacity = max(MIN_FILTER_CAPACITY, UserProfile.objects.count() * 2)
+    snapshot = _Snapshot(BloomFilter(capacity, settings.USERNAME_FILTER_ERROR_RATE), 0, time.monotonic())
+    # Keyset pages rather than a server-side cursor, which the transaction
+    # pooler would drop outside a transaction (this runs in worker warm-up)
+    rows = UserProfile.objects.values_list('id', 'username')
+    _add_profiles(snapshot, iter_by_id(rows, chunk_size=10000))
+    return snapshot
+
+
+def _needs_rebuild(snapshot):
+    return (snapshot is None or snapshot.bloom.count > snapshot.bloom.capacity
+            or time.monotonic() - snapshot.built_at > settings.USERNAME_FILTER_MAX_AGE)
+
+
+def _needs_refresh(snapshot):
+    return time.monotonic() - snapshot.refreshed_at > settings.USERNAME_FILTER_REFRESH
+
+
+def get_username_filter():
+    """Return this process's Bloom filter of taken usernames, caught up if due"""
+    global _snapshot
+    snapshot = _snapshot
+
+    if _needs_rebuild(snapshot) or _needs_refresh(snapshot):
+        with _reload_lock:
+            # Another thread may have refreshed it while we waited
+            snapshot = _snapshot
+            if _needs_rebuild(snapshot):
+                snapshot = _snapshot = _build_snapshot()
+            elif _needs_refresh(snapshot):
+                new_profiles = UserProfile.objects.filter(id__gt=snapshot.max_id).values_list('id', 'username')
+                _add_profiles(snapshot, new_profiles)
+                snapshot.refreshed_at = time.monotonic()
+
+    return snapshot.bloom
+
+
+def remember_username(user_profile):
+    """Add a profile created by this worker to its filter right away"""
+    snapshot = _snapshot
+    if snapshot is not None:
+        with _reload_lock:
+            _add_profiles(snapshot, [(user_profile.id, user_profile.username)])
+
+
+def username_error(username):
+    """Why a (lowercased) username cannot be used, or None if its format is valid"""
+    if not USERNAME_MIN_LENGTH <= len(username) <= USERNAME_MAX_LENGTH:
+        return f'Username must be {USERNAME_MIN_LENGTH} to {USERNAME_MAX_LENGTH} characters long.'
+    if not USERNAME_PATTERN.match(username):
+        return 'Username can only contain letters, numbers, and underscores.'
+    return None
+
+
+def may_be_taken(username):
+    """False means definitely free; True means it has to be confirmed"""
+    return username in get_username_filter()
+
+
+def is_username_taken(username):
+    """Check a username, querying the database only on a filter hit"""
+    # Not through the profile cache: a false positive would cache the name
+    # as missing, evicting real profiles for every free name someone types
+    return may_be_taken(username) and UserProfile.objects.filter(username=username).exists()
+
+
+def suggest_usernames(username, count=3):
+    """
+    Free alternatives to a username, judged by the filter alone.
+
+    Candidates the filter may contain are skipped rather than confirmed,
+    so suggestions never cost a query.
+    """
+    base = re.sub(r'[^a-z0-9_]', '', username)[:USERNAME_MAX_LENGTH - 5] or 'user'
+    candidates = [f'{base}_{random.randint(10, 99)}', f'{base}{random.randint(100, 999)}', f'the_{base}',
+                  f'{base}_official', f'real_{base}', f'{base}_{random.randint(1000, 9999)}']
+
+    suggestions = []
+    for candidate in candidates:
+        if username_error(candidate) or candidate in suggestions or may_be_taken(candidate):
+            continue
+        suggestions.append(candidate)
+        if len(suggestions) == count:
+            break
+    return suggestions
+
+
+def check_username(username):
+    """Availability of a username as reported to the signup page"""
+    username = username.lower().strip()
+    error = username_error(username)
+    if error:
+        return {'username': username, 'available': False, 'error': error, 'suggestions': []}
+
+    if is_username_taken(username):
+        return {
+            'username': username,
+            'available': False,
+            'error': 'This username is already taken.',
+            'suggestions': suggest_usernames(username),
+        }
+    return {'username': username, 'available': True, 'error': None, 'suggestions': []}
@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.core.cache import cache
+import threading
+import time
+from .models import BlockedIP
+
+
+BLOCKLIST_VERSION_KEY = 'blocklist:version'
+
+
+class _Snapshot:
+    """Immutable view of the blocklist held by one worker process"""
+
+    def __init__(self, version, ip_hashes, loaded_at):
+        self.version = version
+        self.ip_hashes = ip_hashes
+        self.loaded_at = loaded_at
+
+
+_snapshot = None
+_reload_lock = threading.Lock()
+
+
+def get_blocklist_version():
+    """Current blocklist version as published in the shared cache"""
+    return cache.get(BLOCKLIST_VERSION_KEY, 0)
+
+
+def bump_blocklist_version():
+    """Invalidate every worker's in-memory copy of the blocklist"""
+    try:
+        cache.incr(BLOCKLIST_VERSION_KEY)
+    except ValueError:
+        # Key missing or evicted; any new value forces a reload
+        cache.set(BLOCKLIST_VERSION_KEY, int(time.time() * 1000), None)
+
+
+def _load_snapshot(version):
+    ip_hashes = frozenset(BlockedIP.objects.values_list('ip_hash', flat=True))
+    return _Snapshot(version, ip_hashes, time.monotonic())
+
+
+async def _aload_snapshot(version):
+    ip_hashes = frozenset([ip_hash async for ip_hash in BlockedIP.objects.values_list('ip_hash', flat=True)])
+    return _Snapshot(version, ip_hashes, time.monotonic())
+
+
+def _is_stale(snapshot, version):
+    return (snapshot is None or snapshot.version != version
+            or time.monotonic() - snapshot.loaded_at > settings.BLOCKLIST_MAX_AGE)
+
+
+def get_blocklist():
+    """
+    Return the set of blocked IP hashes for this process.
+
+    The set is reloaded when the published version changes, and at least
+    every BLOCKLIST_MAX_AGE seconds so workers whose cache is not shared
+    (LocMemCache) still pick up new entries quickly.
+    """
+    global _snapshot
+    version = get_blocklist_version()
+    snapshot = _snapshot
+
+    if _is_stale(snapshot, version):
+        with _reload_lock:
+            # Another thread may have refreshed it while we waited
+            snapshot = _snapshot
+            if _is_stale(snapshot, version):
+                snapshot = _snapshot = _load_snapshot(version)
+
+    return snapshot.ip_hashes
+
+
+async def aget_blocklist():
+    """
+    Async version of get_blocklist using the async ORM.
+
+    Concurrent reloads on the event loop are not serialized; the worst case
+    is the same small query running twice.
+    """
+    global _snapshot
+    version = await cache.aget(BLOCKLIST_VERSION_KEY, 0)
+    snapshot = _snapshot
+
+    if _is_stale(snapshot, version):
+        snapshot = _snapshot = await _aload_snapshot(version)
+
+    return snapshot.ip_hashes
+
+
+def is_ip_address_blocked(ip_address):
+    """Check an address and its blockable network prefixes in one set lookup"""
+    return not get_blocklist().isdisjoint(BlockedIP.candidate_hashes(ip_address))
+
+
+async def ais_ip_address_blocked(ip_address):
+    """Async version of is_ip_address_blocked"""
+    return not (await aget_blocklist()).isdisjoint(BlockedIP.candidate_hashes(ip_address))
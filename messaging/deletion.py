@@ -0,0 +1,146 @@
+"""
+Bulk inbox deletion in bounded id-range chunks.
+
+A plain user_profile.messages.all().delete() removes the whole inbox in one
+statement and one transaction, locking every row until it finishes. Here
+each chunk of BULK_DELETE_CHUNK_SIZE messages is one short DELETE on a
+(user, id) range, served by message_user_id_idx and committed on its own.
+No model instances are created, so lock time and memory stay bounded per
+chunk whatever the inbox size.
+
+Inboxes above BULK_DELETE_BACKGROUND_THRESHOLD are deleted by a background
+thread. Its progress is recorded on an InboxDeletion row, which the
+dashboard polls. A job whose worker died stops making progress and is
+picked up again by the next request or by the delete_inbox_messages
+command.
+"""
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import F
+from django.utils import timezone
+from datetime import timedelta
+import threading
+from .ingest import flush_pending_messages
+from .models import Message, MessageArchive, InboxDeletion
+from .stats import get_profile_stats, recompute_stats
+
+
+def delete_message_rows(messages):
+    """
+    Delete the messages a queryset matches in one DELETE; returns the count.
+
+    QuerySet.delete() loads every row first to send pre_delete/post_delete
+    and to follow relations. Neither is needed for Message: no model has a
+    foreign key to it and nothing listens to its delete signals (the
+    search index is kept in sync by database triggers), which
+    test_message_delete_has_no_side_effects guards. Add either and this
+    must go back to .delete().
+    """
+    return messages._raw_delete(router.db_for_write(Message))
+
+
+def delete_messages_in_chunks(user_id, up_to_id, chunk_size=None, progress=None):
+    """
+    Delete a profile's messages with id <= up_to_id, oldest ids first.
+
+    Calls progress(deleted_in_chunk) after every committed chunk and returns
+    the number of messages deleted.
+    """
+    chunk_size = chunk_size or settings.BULK_DELETE_CHUNK_SIZE
+    messages = Message.objects.filter(user_id=user_id)
+    lower = 0
+    total = 0
+
+    while True:
+        # The chunk's last id, read from the (user, id) index alone
+        boundary = list(
+            messages.filter(id__gt=lower, id__lte=up_to_id)
+            .order_by('id').values_list('id', flat=True)[chunk_size - 1:chunk_size]
+        )
+        upper = boundary[0] if boundary else up_to_id
+
+        deleted = delete_message_rows(messages.filter(id__gt=lower, id__lte=upper))
+        total += deleted
+        if progress is not None:
+            progress(deleted)
+
+        if upper >= up_to_id:
+            return total
+        lower = upper
+
+
+def _last_message_id(user_profile):
+    return user_profile.messages.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _delete_archive(user_id):
+    # Archived batches go with the inbox; there are few of them per profile
+    MessageArchive.objects.filter(user_id=user_id).delete()
+
+
+def delete_inbox(user_profile):
+    """Delete every message of a profile right away; returns the count"""
+    flush_pending_messages()
+    count = delete_messages_in_chunks(user_profile.id, _last_message_id(user_profile))
+    _delete_archive(user_profile.id)
+    recompute_stats(user_profile)
+    return count
+
+
+def run_inbox_deletion(job):
+    """Carry out (or resume) a deletion job, recording progress per chunk"""
+    jobs = InboxDeletion.objects.filter(pk=job.pk)
+
+    def progress(deleted):
+        jobs.update(deleted_messages=F('deleted_messages') + deleted, updated_at=timezone.now())
+
+    try:
+        delete_messages_in_chunks(job.user_id, job.up_to_id, progress=progress)
+        _delete_archive(job.user_id)
+        recompute_stats(job.user)
+    except Exception:
+        jobs.update(status='failed', updated_at=timezone.now())
+        raise
+    jobs.update(status='done', updated_at=timezone.now())
+
+
+def _run_in_background(job):
+    try:
+        run_inbox_deletion(job)
+    finally:
+        # The thread ends here; do not leave its connection open
+        connections.close_all()
+
+
+def is_stale(job):
+    """True if a running job has stopped making progress (its worker died)"""
+    return job.updated_at < timezone.now() - timedelta(seconds=settings.BULK_DELETE_STALE_AFTER)
+
+
+def start_inbox_deletion(user_profile):
+    """
+    Start deleting every message of a profile in a background thread.
+
+    Returns the InboxDeletion tracking it. A job already running for the
+    profile is returned as is, and an abandoned one is taken over.
+    """
+    flush_pending_messages()
+    up_to_id = _last_message_id(user_profile)
+    total = get_profile_stats(user_profile).total_messages
+
+    job = InboxDeletion.objects.filter(user=user_profile, status='running').first()
+    if job is not None and not is_stale(job):
+        return job
+
+    if job is None:
+        job = InboxDeletion.objects.create(user=user_profile, up_to_id=up_to_id, total_messages=total)
+    else:
+        job.up_to_id = max(job.up_to_id, up_to_id)
+        job.total_messages = job.deleted_messages + total
+        job.updated_at = timezone.now()
+        job.save(update_fields=['up_to_id', 'total_messages', 'updated_at'])
+
+    threading.Thread(
+        target=_run_in_background, args=(job,), name=f'inbox-deletion-{job.pk}', daemon=True
+    ).start()
+    return job
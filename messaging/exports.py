@@ -0,0 +1,262 @@
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import csv
+import json
+import logging
+import multiprocessing
+import threading
+import zipfile
+import zlib
+from . import cards
+from .archive import unpack_messages
+from .image_cache import share_image_key, get_share_image_cache
+from .pagination import iter_by_id
+
+
+# Inbox export formats: content type and file extension
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+}
+
+EXPORT_FIELDS = ['id', 'timestamp', 'status', 'message_text']
+
+# Encoded output is handed to the server in pieces of about this size
+EXPORT_BUFFER_BYTES = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """Process pool for CPU-bound card rendering, created on first use"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # Spawned children only import the card renderer, never Django or
+            # the parent's open database connections
+            _render_pool = ProcessPoolExecutor(
+                max_workers=settings.SHARE_IMAGE_EXPORT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=cards.warm_up,
+            )
+        return _render_pool
+
+
+def shutdown_render_pool():
+    """Stop the render processes, e.g. when the web worker exits"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=True, cancel_futures=True)
+            _render_pool = None
+
+
+def _iter_card_messages(user_profile, chunk_size):
+    """(id, message_text) of the inbox, then of the archived batches, newest first"""
+    rows = user_profile.messages.values_list('id', 'message_text')
+    yield from iter_by_id(rows, chunk_size, descending=True)
+
+    # A couple of batches per query; each holds up to MESSAGE_ARCHIVE_BATCH_SIZE messages
+    for archive in iter_by_id(user_profile.message_archives.all(), chunk_size=2, descending=True):
+        for message in reversed(unpack_messages(archive)):
+            yield message.id, message.message_text
+
+
+def iter_share_cards(user_profile, chunk_size=200):
+    """
+    Yield (filename, png_bytes) for every message of a profile, archived ones included.
+
+    Cached cards are yielded straight away; misses are rendered across the
+    process pool with at most a couple of renders in flight per core, and
+    yielded in the order they finish. Bulk renders are not written back to
+    the share image cache, which would evict the cards people actually
+    open, and a card that fails to render is logged and left out.
+    """
+    pool = get_render_pool()
+    cache = get_share_image_cache()
+    username = user_profile.username
+    max_in_flight = settings.SHARE_IMAGE_EXPORT_WORKERS * 2
+    in_flight = {}
+
+    def drain(return_when):
+        done, _ = wait(in_flight, return_when=return_when)
+        for future in done:
+            filename = in_flight.pop(future)
+            try:
+                image_bytes = future.result()
+            except Exception:
+                logger.exception('Could not render %s for %s', filename, username)
+                continue
+            yield filename, image_bytes
+
+    try:
+        for message_id, message_text in _iter_card_messages(user_profile, chunk_size):
+            filename = f"message_{message_id}.png"
+            key = share_image_key(message_text, username)
+
+            image_bytes = cache.get(key)
+            if image_bytes is not None:
+                yield filename, image_bytes
+                continue
+
+            in_flight[pool.submit(cards.render_card, message_text, username)] = filename
+            if len(in_flight) >= max_in_flight:
+                yield from drain(FIRST_COMPLETED)
+
+        while in_flight:
+            yield from drain(FIRST_COMPLETED)
+    finally:
+        # Client went away mid-download; do not keep rendering for nobody
+        for future in in_flight:
+            future.cancel()
+
+
+class _ZipStream:
+    """Write-only file object that hands zipfile output back in chunks"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_share_cards_zip(user_profile):
+    """Generate a ZIP of every share card, one member at a time"""
+    stream = _ZipStream()
+    # PNGs are already compressed, so members are stored as-is
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for filename, image_bytes in iter_share_cards(user_profile):
+            archive.writestr(filename, image_bytes)
+            yield stream.drain()
+    yield stream.drain()
+
+
+def iter_export_messages(user_profile, chunk_size=None):
+    """
+    Yield (id, timestamp, status, message_text) for every message, newest first.
+
+    The inbox is read MESSAGE_EXPORT_CHUNK_SIZE rows at a time with the
+    dashboard's keyset on (timestamp, id), then the archived batches a
+    couple at a time. Every chunk is a short query of its own, so no
+    transaction stays open (pinning a server connection behind PgBouncer)
+    while the client downloads, and memory does not depend on the inbox
+    size.
+    """
+    chunk_size = chunk_size or settings.MESSAGE_EXPORT_CHUNK_SIZE
+    rows = user_profile.messages.order_by('-timestamp', '-id').values_list(*EXPORT_FIELDS)
+    page = rows
+    while True:
+        chunk = list(page[:chunk_size])
+        yield from chunk
+        if len(chunk) < chunk_size:
+            break
+        message_id, timestamp = chunk[-1][:2]
+        page = rows.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id))
+
+    for archive in iter_by_id(user_profile.message_archives.all(), chunk_size=2, descending=True):
+        for message in reversed(unpack_messages(archive)):
+            yield message.id, message.timestamp, message.status, message.message_text
+
+
+class _Echo:
+    """File object for csv.writer that returns each row instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def _encode_lines(user_profile, export_format):
+    if export_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(EXPORT_FIELDS)
+        for message_id, timestamp, status, message_text in iter_export_messages(user_profile):
+            yield writer.writerow([message_id, timestamp.isoformat(), status, message_text])
+    else:
+        for message_id, timestamp, status, message_text in iter_export_messages(user_profile):
+            yield json.dumps({
+                'id': message_id,
+                'timestamp': timestamp.isoformat(),
+                'status': status,
+                'message_text': message_text,
+            }, ensure_ascii=False) + '\n'
+
+
+def stream_messages_export(user_profile, export_format='csv', compress=False):
+    """
+    Generate the inbox export as bytes, optionally gzip-compressed on the fly.
+
+    The first piece is sent before the inbox query runs (the CSV header,
+    or the gzip header), so the download starts right away.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16) if compress else None
+    if compressor is not None:
+        yield compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    buffer = []
+    size = 0
+    first = True
+    for line in _encode_lines(user_profile, export_format):
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if first or size >= EXPORT_BUFFER_BYTES:
+            data = b''.join(buffer)
+            buffer, size, first = [], 0, False
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+
+    data = b''.join(buffer)
+    if compressor is not None:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+async def _aiter_sync(iterator):
+    """
+    Drive a sync generator from the event loop, one piece at a time.
+
+    Under ASGI, Django buffers a sync iterator completely before sending
+    it. Every step runs on the same sync thread, which keeps the
+    generator's database connection.
+    """
+    done = object()
+    step = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await step(iterator, done)
+            if chunk is done:
+                return
+            yield chunk
+    finally:
+        await sync_to_async(iterator.close, thread_sensitive=True)()
+
+
+def streaming_download(request, chunks, content_type, filename):
+    """A StreamingHttpResponse attachment that streams under both WSGI and ASGI"""
+    if isinstance(request, ASGIRequest):
+        chunks = _aiter_sync(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['Cache-Control'] = 'private, no-store'
+    return response
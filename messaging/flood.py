@@ -0,0 +1,178 @@
+"""
+Near-duplicate flood detection per recipient.
+
+Every accepted message leaves a MinHash signature in a small SQLite file
+(FLOOD_STORE_PATH), next to the rate limiter's counters, so the window is
+shared by every worker on the host. A check reads, compares and extends a
+recipient's window inside one write transaction, so two workers cannot
+both let the same burst through.
+"""
+from django.conf import settings
+import hashlib
+import heapq
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+
+
+# Characters per shingle and number of hashes kept per signature
+SHINGLE_SIZE = 5
+SIGNATURE_SIZE = 32
+
+# Seconds between purges of expired signatures, per process
+EXPIRY_INTERVAL = 60
+
+
+def shingles(text):
+    """
+    Overlapping character shingles of the lowercased, whitespace-collapsed text.
+
+    Punctuation and emoji are dropped so decorated copies still match, unless
+    that leaves less than a shingle: emoji-only or punctuation-only messages
+    are compared as typed, so '😂' and '🥺' do not count as duplicates.
+    """
+    typed = re.sub(r'\s+', ' ', text.lower()).strip()
+    text = re.sub(r'\s+', ' ', re.sub(r'[^\w\s]', '', typed)).strip()
+    if len(text) < SHINGLE_SIZE:
+        text = typed
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text):
+    """
+    Bottom-k MinHash signature: the k smallest 64-bit hashes of the shingles.
+
+    Messages are capped at 500 characters, so building a signature costs a
+    bounded number of hashes.
+    """
+    hashes = {
+        int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big')
+        for shingle in shingles(text)
+    }
+    return tuple(heapq.nsmallest(SIGNATURE_SIZE, hashes))
+
+
+def estimate_similarity(a, b):
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    if not a or not b:
+        return 0.0
+    a, b = set(a), set(b)
+    union_bottom = heapq.nsmallest(SIGNATURE_SIZE, a | b)
+    both = a & b
+    return sum(1 for h in union_bottom if h in both) / len(union_bottom)
+
+
+def _pack(signature):
+    return struct.pack(f'>{len(signature)}Q', *signature)
+
+
+def _unpack(blob):
+    return struct.unpack(f'>{len(blob) // 8}Q', blob)
+
+
+class FloodWindowStore:
+    """Recent message signatures per recipient in a SQLite file"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._last_expiry = 0
+
+    def _connection(self):
+        # One connection per thread and per process (never reuse across fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS signatures ('
+                ' user_id INTEGER NOT NULL,'
+                ' sent_at REAL NOT NULL,'
+                ' signature BLOB NOT NULL'
+                ')'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS signatures_user_sent_at ON signatures (user_id, sent_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS signatures_sent_at ON signatures (sent_at)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def check(self, user_id, signature, now=None):
+        """Compare a signature with the recipient's window and record it unless it floods"""
+        now = time.time() if now is None else now
+        conn = self._connection()
+
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent
+        # checks for a recipient run one after another
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            window = conn.execute(
+                'SELECT signature FROM signatures WHERE user_id = ? AND sent_at > ? '
+                'ORDER BY sent_at DESC LIMIT ?',
+                (user_id, now - settings.FLOOD_WINDOW_SECONDS, settings.FLOOD_WINDOW_SIZE),
+            ).fetchall()
+
+            duplicates = sum(
+                1 for (other,) in window
+                if estimate_similarity(signature, _unpack(other)) >= settings.FLOOD_SIMILARITY_THRESHOLD
+            )
+            flooded = duplicates >= settings.FLOOD_DUPLICATE_LIMIT
+            if not flooded:
+                conn.execute(
+                    'INSERT INTO signatures (user_id, sent_at, signature) VALUES (?, ?, ?)',
+                    (user_id, now, _pack(signature)),
+                )
+                if len(window) >= settings.FLOOD_WINDOW_SIZE:
+                    conn.execute(
+                        'DELETE FROM signatures WHERE user_id = ? AND rowid NOT IN ('
+                        ' SELECT rowid FROM signatures WHERE user_id = ? ORDER BY sent_at DESC LIMIT ?'
+                        ')',
+                        (user_id, user_id, settings.FLOOD_WINDOW_SIZE),
+                    )
+            self._expire(conn, now)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return flooded
+
+    def _expire(self, conn, now):
+        if now - self._last_expiry < EXPIRY_INTERVAL:
+            return
+        self._last_expiry = now
+        conn.execute('DELETE FROM signatures WHERE sent_at <= ?', (now - settings.FLOOD_WINDOW_SECONDS,))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_flood_store():
+    """Process-wide store configured from settings"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FloodWindowStore(settings.FLOOD_STORE_PATH)
+        return _store
+
+
+def check_flood(user_id, message_text):
+    """
+    Check a message against the recipient's recent signatures and record it.
+
+    Returns True when the recipient already received FLOOD_DUPLICATE_LIMIT
+    near-duplicates of it within FLOOD_WINDOW_SECONDS; such messages are
+    not recorded. The window holds at most FLOOD_WINDOW_SIZE signatures, so
+    a check costs the same no matter how many messages the inbox holds.
+    Messages are let through if the store cannot be reached.
+    """
+    try:
+        return get_flood_store().check(user_id, minhash_signature(message_text))
+    except sqlite3.Error:
+        return False
@@ -1,6 +1,8 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from .availability import may_be_taken
 from .models import UserProfile, Message
+from .spam import contains_spam
 import re
 
 
@@ -23,8 +25,9 @@ class CreateProfileForm(forms.Form):
         if not re.match(r'^[a-z0-9_]+$', username):
             raise ValidationError('Username can only contain letters, numbers, and underscores.')
         
-        # Check if username already exists
-        if UserProfile.objects.filter(username=username).exists():
+        # Check if username already exists; names this worker's filter has
+        # never seen are free without a query
+        if may_be_taken(username) and UserProfile.objects.filter(username=username).exists():
             raise ValidationError('This username is already taken. Please choose another.')
         
         return username
@@ -48,9 +51,8 @@ class SendMessageForm(forms.Form):
         if len(message) < 1:
             raise ValidationError('Message cannot be empty.')
         
-        # Basic spam detection
-        spam_words = ['viagra', 'casino', 'lottery', 'winner']
-        if any(word in message.lower() for word in spam_words):
+        # Spam detection against the moderated word list
+        if contains_spam(message):
             raise ValidationError('Your message contains prohibited content.')
         
         return message
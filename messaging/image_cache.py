@@ -0,0 +1,98 @@
+from django.conf import settings
+import hashlib
+import os
+import tempfile
+
+
+# Bump whenever the share image layout changes so stale renders are not served
+SHARE_IMAGE_LAYOUT_VERSION = 1
+
+
+def share_image_key(message_text, username):
+    """Content address of a rendered share image"""
+    payload = f"{SHARE_IMAGE_LAYOUT_VERSION}\0{username}\0{message_text}"
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ShareImageCache:
+    """
+    Size-bounded, least-recently-used disk cache for rendered share images.
+
+    Entries are immutable PNG files named after their content key, so every
+    worker process can share the same directory. A hit refreshes the file's
+    mtime, and writes evict the oldest files once the directory grows past
+    the configured size.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key):
+        """Return the cached bytes for a key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def set(self, key, data):
+        """Store bytes for a key; failures only cost a future re-render"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            # Atomic rename so readers never see a partially written file
+            os.replace(tmp_path, self._path(key))
+            self.evict()
+        except OSError:
+            pass
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits its budget"""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith('.png'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+_share_image_cache = None
+
+
+def get_share_image_cache():
+    """Process-wide cache instance configured from settings"""
+    global _share_image_cache
+    if _share_image_cache is None:
+        _share_image_cache = ShareImageCache(
+            settings.SHARE_IMAGE_CACHE_DIR,
+            settings.SHARE_IMAGE_CACHE_MAX_BYTES,
+        )
+    return _share_image_cache
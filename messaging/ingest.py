@@ -0,0 +1,255 @@
+"""
+Message ingestion: synchronous inserts or a write-behind queue.
+
+With MESSAGE_INGESTION_MODE = 'queued' the send path only appends the
+message to a durable SQLite journal on local disk (MESSAGE_QUEUE_PATH) and
+acknowledges the sender. A flusher moves queued messages into the database
+with bulk_create and updates the profile counters in the same transaction.
+It runs in a background thread in every worker and through the
+flush_message_queue command; dashboard reads only wake it up.
+
+A flusher first claims a batch in a short journal transaction, then writes
+it to the database without holding the journal lock, so senders never wait
+on the database. Delivery is at-least-once: a batch leaves the journal only
+after its database transaction has committed, and a claim left behind by a
+crashed flusher expires after MESSAGE_QUEUE_CLAIM_TIMEOUT seconds, so a
+crash can at worst replay one batch.
+"""
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+import os
+import sqlite3
+import threading
+import time
+from .models import UserProfile, Message
+from .stats import record_message_sent, record_batch_sent
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class MessageQueue:
+    """Append-only journal of accepted messages waiting to be written"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # Every acknowledged message must survive a crash or power loss
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS queued_messages ('
+                ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+                ' user_id INTEGER NOT NULL,'
+                ' message_text TEXT NOT NULL,'
+                ' sender_ip_hash TEXT,'
+                ' timestamp_us INTEGER NOT NULL,'
+                ' claimed_at REAL'
+                ')'
+            )
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(queued_messages)')}
+            if 'claimed_at' not in columns:
+                # Journals written before batches were claimed
+                conn.execute('ALTER TABLE queued_messages ADD COLUMN claimed_at REAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def enqueue(self, user_id, message_text, sender_ip_hash, timestamp):
+        """Durably append a message; returns the number of messages now pending"""
+        timestamp_us = (timestamp - EPOCH) // timedelta(microseconds=1)
+        conn = self._connection()
+        conn.execute(
+            'INSERT INTO queued_messages (user_id, message_text, sender_ip_hash, timestamp_us) '
+            'VALUES (?, ?, ?, ?)',
+            (user_id, message_text, sender_ip_hash, timestamp_us),
+        )
+        return self.pending_count()
+
+    def pending_count(self):
+        # Batches are claimed from the front, so the id span is the backlog
+        # size (an upper bound while flushers finish out of order) and costs
+        # two primary-key lookups instead of a scan
+        low, high = self._connection().execute(
+            'SELECT MIN(id), MAX(id) FROM queued_messages'
+        ).fetchone()
+        return 0 if low is None else high - low + 1
+
+    def claim_batch(self, batch_size):
+        """
+        Claim up to batch_size of the oldest unclaimed (or abandoned) entries.
+
+        The journal's write lock is only held for this SELECT and UPDATE.
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                'SELECT id, user_id, message_text, sender_ip_hash, timestamp_us FROM queued_messages '
+                'WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY id LIMIT ?',
+                (now - settings.MESSAGE_QUEUE_CLAIM_TIMEOUT, batch_size),
+            ).fetchall()
+            conn.executemany('UPDATE queued_messages SET claimed_at = ? WHERE id = ?', [(now, row[0]) for row in rows])
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return rows
+
+    def flush_batch(self, batch_size):
+        """
+        Move up to batch_size messages into the database.
+
+        Returns the number of journal entries processed. If the database
+        write fails, the claim is released so the next flush retries it.
+        """
+        rows = self.claim_batch(batch_size)
+        if not rows:
+            return 0
+
+        ids = [(row[0],) for row in rows]
+        conn = self._connection()
+        try:
+            _write_batch(rows)
+        except BaseException:
+            conn.executemany('UPDATE queued_messages SET claimed_at = NULL WHERE id = ?', ids)
+            raise
+        conn.executemany('DELETE FROM queued_messages WHERE id = ?', ids)
+        return len(rows)
+
+    def flush(self, batch_size=None):
+        """Drain the journal; returns the number of entries processed"""
+        batch_size = batch_size or settings.MESSAGE_QUEUE_BATCH_SIZE
+        total = 0
+        while True:
+            flushed = self.flush_batch(batch_size)
+            total += flushed
+            if flushed < batch_size:
+                return total
+
+
+def _write_batch(rows):
+    """Insert one journal batch and update the counters of every recipient"""
+    profiles = UserProfile.objects.in_bulk({row[1] for row in rows})
+    by_profile = defaultdict(list)
+    for _, user_id, message_text, sender_ip_hash, timestamp_us in rows:
+        # Profiles deleted while their messages were queued are skipped
+        if user_id not in profiles:
+            continue
+        by_profile[user_id].append(Message(
+            user_id=user_id,
+            message_text=message_text,
+            sender_ip_hash=sender_ip_hash,
+            timestamp=EPOCH + timedelta(microseconds=timestamp_us),
+        ))
+
+    with transaction.atomic():
+        Message.objects.bulk_create(
+            [message for messages_list in by_profile.values() for message in messages_list]
+        )
+        record_batch_sent(profiles, by_profile)
+
+
+_queue = None
+_flusher = None
+_flusher_wakeup = threading.Event()
+_setup_lock = threading.Lock()
+
+
+def get_message_queue():
+    """Process-wide queue configured from settings"""
+    global _queue
+    with _setup_lock:
+        if _queue is None:
+            _queue = MessageQueue(settings.MESSAGE_QUEUE_PATH)
+        return _queue
+
+
+def _flusher_loop():
+    queue = get_message_queue()
+    while True:
+        # Flush when a full batch is waiting, or at the latest after MAX_DELAY
+        _flusher_wakeup.wait(settings.MESSAGE_QUEUE_MAX_DELAY)
+        _flusher_wakeup.clear()
+        try:
+            queue.flush()
+        except Exception:
+            # Leave the rows in the journal and retry on the next tick
+            time.sleep(settings.MESSAGE_QUEUE_MAX_DELAY)
+        finally:
+            close_old_connections()
+
+
+def _ensure_flusher():
+    """Start this worker's flusher thread (threads do not survive a fork)"""
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _setup_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flusher_loop, name='message-queue-flusher', daemon=True)
+            _flusher.start()
+
+
+def is_queued_mode():
+    return settings.MESSAGE_INGESTION_MODE == 'queued'
+
+
+def submit_message(user_profile, message_text, sender_ip_hash):
+    """Store an accepted message, either right away or through the queue"""
+    if not is_queued_mode():
+        message = Message.objects.create(
+            user=user_profile,
+            message_text=message_text,
+            sender_ip_hash=sender_ip_hash,
+        )
+        record_message_sent(user_profile, message)
+        return
+
+    pending = get_message_queue().enqueue(
+        user_profile.id, message_text, sender_ip_hash, timezone.now()
+    )
+    _ensure_flusher()
+    if pending >= settings.MESSAGE_QUEUE_BATCH_SIZE:
+        _flusher_wakeup.set()
+
+
+async def asubmit_message(user_profile, message_text, sender_ip_hash):
+    """Async version of submit_message; the insert goes through the async ORM"""
+    if is_queued_mode():
+        await sync_to_async(submit_message, thread_sensitive=False)(
+            user_profile, message_text, sender_ip_hash
+        )
+        return
+
+    message = await Message.objects.acreate(
+        user=user_profile,
+        message_text=message_text,
+        sender_ip_hash=sender_ip_hash,
+    )
+    # The counter update locks its row inside a transaction, which the async
+    # ORM cannot express
+    await sync_to_async(record_message_sent)(user_profile, message)
+
+
+def flush_pending_messages():
+    """Write every queued message now; for commands, requests only wake the flusher"""
+    if is_queued_mode():
+        get_message_queue().flush()
+
+
+def wake_flusher():
+    """Ask this worker's flusher to write queued messages now, without waiting for it"""
+    if is_queued_mode():
+        _ensure_flusher()
+        _flusher_wakeup.set()
@@ -0,0 +1,160 @@
+"""
+Live inbox updates for dashboards served over ASGI.
+
+Each open dashboard holds a server-sent events stream. Connections do not
+poll the database themselves. They wait on an InboxHub, which runs one
+query per LIVE_UPDATES_POLL_INTERVAL for all watched profiles in the
+process and wakes the streams whose ProfileStats row changed. The counters
+are updated whenever a message is stored or deleted. An idle connection
+therefore costs an asyncio.Event, not a worker or a query.
+
+Reads go through run_read, never through the async ORM: Django 4.2 runs
+async ORM calls on the request's own thread and keeps that thread and its
+database connection until the response ends, which for a stream is
+LIVE_UPDATES_STREAM_TIMEOUT seconds. Django 4.2 also does not notice a
+closed tab, so its stream lives until that timeout too.
+"""
+from django.conf import settings
+from django.db import connection
+from asgiref.sync import sync_to_async
+import asyncio
+import json
+import time
+from .models import Message, ProfileStats
+from .ingest import wake_flusher
+from .pagination import MESSAGES_PAGE_SIZE, serialize_message
+from .stats import summarize_stats
+
+
+class InboxHub:
+    """Fan-out of ProfileStats changes to the streams waiting on them"""
+
+    def __init__(self):
+        self._markers = {}
+        self._waiters = {}
+        self._task = None
+
+    async def wait_for_change(self, user_id, seen, timeout):
+        """
+        Wait until the profile's stats marker differs from `seen`.
+
+        Returns the current marker, which equals `seen` if the timeout
+        passed without a change.
+        """
+        current = self._markers.setdefault(user_id, seen)
+        if current != seen:
+            return current
+
+        event = asyncio.Event()
+        self._waiters.setdefault(user_id, set()).add(event)
+        self._ensure_running()
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            current = self._markers.get(user_id, seen)
+            waiters = self._waiters.get(user_id)
+            if waiters is not None:
+                waiters.discard(event)
+                if not waiters:
+                    del self._waiters[user_id]
+                    self._markers.pop(user_id, None)
+
+        return current
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while self._waiters:
+            await asyncio.sleep(settings.LIVE_UPDATES_POLL_INTERVAL)
+
+            user_ids = list(self._waiters)
+            rows = ProfileStats.objects.filter(user_id__in=user_ids).values_list('user_id', 'updated_at')
+            markers = dict(await run_read(list, rows))
+
+            for user_id in user_ids:
+                marker = markers.get(user_id)
+                if user_id in self._markers and self._markers[user_id] != marker:
+                    self._markers[user_id] = marker
+                    for event in self._waiters.get(user_id, ()):
+                        event.set()
+
+
+hub = InboxHub()
+
+
+async def run_read(func, *args):
+    """Run a short sync read on the shared thread pool and close its database connection"""
+    def read():
+        try:
+            return func(*args)
+        finally:
+            # Pool threads are shared by every stream; do not leave one
+            # connection open per thread between reads
+            connection.close()
+
+    return await sync_to_async(read, thread_sensitive=False)()
+
+
+def _sse(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+async def _get_stats(user_id):
+    return await run_read(ProfileStats.objects.filter(user_id=user_id).first)
+
+
+async def _new_messages(user_id, since_id):
+    queryset = Message.objects.filter(user_id=user_id, id__gt=since_id).order_by('id')
+    return await run_read(list, queryset[:MESSAGES_PAGE_SIZE])
+
+
+async def inbox_event_stream(user_id, since_id):
+    """
+    Yield SSE frames with new messages and counter changes for one inbox.
+
+    The stream ends after LIVE_UPDATES_STREAM_TIMEOUT seconds; EventSource
+    reconnects on its own and resumes from the Last-Event-ID it was sent.
+    """
+    deadline = time.monotonic() + settings.LIVE_UPDATES_STREAM_TIMEOUT
+    # Tell EventSource how long to wait before reconnecting
+    yield 'retry: 3000\n\n'
+
+    stats = await _get_stats(user_id)
+    seen = stats.updated_at if stats else None
+
+    while True:
+        # Catch up on everything newer than the last id sent
+        wake_flusher()
+        while True:
+            messages_list = await _new_messages(user_id, since_id)
+            for message in messages_list:
+                since_id = message.id
+                yield _sse('message', serialize_message(message), event_id=message.id)
+            if len(messages_list) < MESSAGES_PAGE_SIZE:
+                break
+
+        if stats is not None:
+            yield _sse('stats', summarize_stats(stats))
+
+        # Wait for the next change, sending a heartbeat comment on timeouts
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            marker = await hub.wait_for_change(
+                user_id, seen, min(settings.LIVE_UPDATES_HEARTBEAT, remaining)
+            )
+            if marker != seen:
+                seen = marker
+                stats = await _get_stats(user_id)
+                break
+            yield ': keepalive\n\n'
@@ -0,0 +1,166 @@
+"""
+PIN brute-force protection shared by every worker on the host.
+
+Failed PIN attempts are counted per username and per client IP in a small
+SQLite file (AUTH_LOCKOUT_STORE_PATH), next to the rate limiter's
+counters. Once a key reaches its threshold in AUTH_LOCKOUT_THRESHOLDS it
+is locked out for AUTH_LOCKOUT_BASE_SECONDS, doubled on every further
+failure up to AUTH_LOCKOUT_MAX_SECONDS. Failures are forgotten after
+AUTH_LOCKOUT_RESET_AFTER quiet seconds, and a correct PIN clears the
+username's counter.
+
+Views check for a lockout before they look the profile up or touch the
+session, so a locked-out guess costs one primary-key read in SQLite and
+never reaches the database or the session store.
+"""
+from django.conf import settings
+from django.http import HttpResponse
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+
+
+# Seconds between purges of forgotten counters, per process
+EXPIRY_INTERVAL = 60
+
+
+def lockout_seconds(failures, threshold):
+    """Length of the lockout imposed after this many consecutive failures"""
+    if failures < threshold:
+        return 0
+    return min(settings.AUTH_LOCKOUT_BASE_SECONDS * 2 ** (failures - threshold), settings.AUTH_LOCKOUT_MAX_SECONDS)
+
+
+class FailureStore:
+    """Consecutive failure counters and lockout deadlines in a SQLite file"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._last_expiry = 0
+
+    def _connection(self):
+        # One connection per thread and per process (never reuse across fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS failures ('
+                ' key TEXT PRIMARY KEY,'
+                ' failures INTEGER NOT NULL,'
+                ' locked_until REAL NOT NULL,'
+                ' last_failure REAL NOT NULL'
+                ') WITHOUT ROWID'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS failures_last_failure ON failures (last_failure)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def locked_for(self, keys, now=None):
+        """Seconds until the last of these keys is unlocked, 0 if none is locked"""
+        now = time.time() if now is None else now
+        placeholders = ', '.join('?' * len(keys))
+        row = self._connection().execute(
+            f'SELECT MAX(locked_until) FROM failures WHERE key IN ({placeholders})', keys
+        ).fetchone()
+        return max(0, math.ceil((row[0] or 0) - now))
+
+    def record_failure(self, key, threshold, now=None):
+        """Count a failure and lock the key out if it reached the threshold; returns the count"""
+        now = time.time() if now is None else now
+        conn = self._connection()
+
+        # A single atomic UPSERT; a counter idle for too long starts over
+        failures = conn.execute(
+            'INSERT INTO failures (key, failures, locked_until, last_failure) VALUES (?, 1, 0, ?) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            ' failures = CASE WHEN last_failure < ? THEN 1 ELSE failures + 1 END,'
+            ' last_failure = excluded.last_failure '
+            'RETURNING failures',
+            (key, now, now - settings.AUTH_LOCKOUT_RESET_AFTER),
+        ).fetchone()[0]
+
+        seconds = lockout_seconds(failures, threshold)
+        if seconds:
+            conn.execute(
+                'UPDATE failures SET locked_until = MAX(locked_until, ?) WHERE key = ?', (now + seconds, key)
+            )
+
+        self._expire(conn, now)
+        return failures
+
+    def clear(self, key):
+        self._connection().execute('DELETE FROM failures WHERE key = ?', (key,))
+
+    def _expire(self, conn, now):
+        if now - self._last_expiry < EXPIRY_INTERVAL:
+            return
+        self._last_expiry = now
+        conn.execute(
+            'DELETE FROM failures WHERE last_failure < ? AND locked_until < ?',
+            (now - settings.AUTH_LOCKOUT_RESET_AFTER, now),
+        )
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_failure_store():
+    """Process-wide store configured from settings"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = FailureStore(settings.AUTH_LOCKOUT_STORE_PATH)
+        return _store
+
+
+def _keys(username, ip_address):
+    # Hashed like everything else we keep about clients
+    return {
+        'username': hashlib.sha256(f'username:{username.lower()}'.encode()).hexdigest(),
+        'ip': hashlib.sha256(f'ip:{ip_address}'.encode()).hexdigest(),
+    }
+
+
+def get_lockout(username, ip_address):
+    """Seconds before this username or address may try a PIN again, 0 if allowed"""
+    try:
+        return get_failure_store().locked_for(list(_keys(username, ip_address).values()))
+    except sqlite3.Error:
+        # Fail open: a broken store must not lock every user out
+        return 0
+
+
+def record_pin_failure(username, ip_address, scopes=('username', 'ip')):
+    """Count a failed attempt against the username and/or the client address"""
+    keys = _keys(username, ip_address)
+    try:
+        for scope in scopes:
+            get_failure_store().record_failure(keys[scope], settings.AUTH_LOCKOUT_THRESHOLDS[scope])
+    except sqlite3.Error:
+        pass
+
+
+def clear_pin_failures(username):
+    """Forget a username's failures after a correct PIN"""
+    try:
+        get_failure_store().clear(_keys(username, '')['username'])
+    except sqlite3.Error:
+        pass
+
+
+def lockout_response(retry_after):
+    """Plain 429 for a locked-out attempt; rendering a page would need the session"""
+    response = HttpResponse(
+        f'Too many incorrect PINs. Try again in {retry_after} seconds.',
+        status=429, content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(retry_after)
+    return response
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.db.models.functions import Length
+from django.utils import timezone
+from datetime import timedelta
+import time
+from messaging.archive import archive_old_messages
+from messaging.ingest import flush_pending_messages
+from messaging.models import Message, MessageArchive
+
+
+class Command(BaseCommand):
+    help = (
+        'Move messages older than the retention period (MESSAGE_RETENTION_DAYS) out of '
+        'the inbox into compressed per-profile archive batches. Safe to interrupt and '
+        'rerun; schedule it daily.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Archive messages older than this many days')
+        parser.add_argument('--batch-size', type=int, default=None, help='Messages per archive batch')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the messages that would be archived')
+
+    def handle(self, *args, **options):
+        days = settings.MESSAGE_RETENTION_DAYS if options['days'] is None else options['days']
+
+        if options['dry_run']:
+            cutoff = timezone.now() - timedelta(days=days)
+            count = Message.objects.filter(timestamp__lt=cutoff).count()
+            self.stdout.write(f'{count} messages are older than {days} days.')
+            return
+
+        flush_pending_messages()
+        start = time.perf_counter()
+
+        def progress(user_profile, archived):
+            self.stdout.write(f'Archived {archived} messages of {user_profile.username}')
+
+        total = archive_old_messages(days, options['batch_size'], progress=progress)
+
+        archive = MessageArchive.objects.aggregate(messages=Sum('message_count'), size=Sum(Length('data')))
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {total} messages older than {days} days in {time.perf_counter() - start:.1f}s. '
+            f"The archive holds {archive['messages'] or 0} messages in {(archive['size'] or 0) / 1024:,.0f} KiB."
+        ))
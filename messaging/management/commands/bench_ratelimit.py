@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from messaging.ratelimit import SlidingWindowStore
+import multiprocessing
+import os
+import tempfile
+import time
+
+
+def _hammer(args):
+    """Worker: hit one key repeatedly and return per-decision latencies"""
+    path, key, hits = args
+    store = SlidingWindowStore(path)
+    latencies = []
+    for _ in range(hits):
+        start = time.perf_counter()
+        store.hit(key, 3600)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+class Command(BaseCommand):
+    help = 'Hammer one rate-limit key from several processes and report latency and lost increments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--hits', type=int, default=2000, help='Hits per process')
+
+    def handle(self, *args, **options):
+        processes, hits = options['processes'], options['hits']
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'ratelimit.sqlite3')
+            # Create the schema before the workers race for it
+            SlidingWindowStore(path).hit('warmup', 3600)
+
+            start = time.perf_counter()
+            with multiprocessing.get_context('spawn').Pool(processes) as pool:
+                results = pool.map(_hammer, [(path, 'bench', hits)] * processes)
+            elapsed = time.perf_counter() - start
+
+            # One more hit reads back the final count in the same window
+            final = SlidingWindowStore(path).hit('bench', 3600)
+
+        latencies = sorted(latency for result in results for latency in result)
+        total = len(latencies)
+        self.stdout.write(f'{processes} processes x {hits} hits on one key in {elapsed:.2f}s')
+        self.stdout.write(f'throughput: {total / elapsed:,.0f} decisions/s')
+        self.stdout.write(
+            f'latency: p50 {latencies[total // 2] * 1e6:.0f} us, '
+            f'p99 {latencies[int(total * 0.99)] * 1e6:.0f} us'
+        )
+        # final includes the read-back hit; the previous window may add a fraction
+        lost = total + 1 - int(final)
+        self.stdout.write(self.style.SUCCESS(f'lost increments: {max(lost, 0)}'))
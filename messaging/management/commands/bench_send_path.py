@@ -0,0 +1,240 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlencode
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from messaging.models import UserProfile
+
+
+BENCH_USERNAME = '__sendbench'
+CSRF_TOKEN = 'b' * 32
+
+
+def _message_body():
+    # Unrelated random texts from random addresses, so neither the flood
+    # check nor the rate limit rejects the load (both still run)
+    return urlencode({'message_text': ' '.join(uuid.uuid4().hex for _ in range(3))}).encode()
+
+
+def _random_ip():
+    return f'10.{random.randrange(256)}.{random.randrange(256)}.{random.randrange(1, 255)}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-test the send endpoint with concurrent senders through the real WSGI and '
+        'ASGI handlers, once with the sync views and a fixed pool of sync workers and '
+        'once with the async views on one event loop, and compare throughput and p99. '
+        'Every query is delayed by --db-latency-ms to stand in for the round trip to a '
+        'hosted database; point DATABASE_URL at a local PostgreSQL for realistic numbers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--senders', type=int, default=50, help='Concurrent senders')
+        parser.add_argument('--requests', type=int, default=1000, help='Total requests per mode')
+        parser.add_argument('--workers', type=int, default=3, help='Sync workers (as in start.sh)')
+        parser.add_argument('--db-latency-ms', type=float, default=5.0)
+        parser.add_argument('--mode', choices=['sync', 'async'], help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self.stdout.write(json.dumps(self.run_mode(options)))
+            return
+
+        if connection.vendor == 'sqlite':
+            self.stderr.write(self.style.WARNING(
+                'SQLite allows one writer at a time: lock waits and "database is locked" '
+                'errors will dominate both modes. Use PostgreSQL for a meaningful comparison.'
+            ))
+
+        UserProfile.objects.get_or_create(username=BENCH_USERNAME, defaults={'pin': '0000'})
+        try:
+            results = [self.spawn(mode, options) for mode in ('sync', 'async')]
+        finally:
+            UserProfile.objects.filter(username=BENCH_USERNAME).delete()
+
+        self.stdout.write(
+            f"{options['senders']} senders, {options['requests']} requests per mode, "
+            f"{options['db_latency_ms']} ms per query, {options['workers']} sync workers"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:>5}: {result['throughput']:8.1f} req/s, "
+                f"p50 {result['p50_ms']:7.1f} ms, p99 {result['p99_ms']:7.1f} ms, "
+                f"errors {result['errors']}"
+            )
+
+        sync_result, async_result = results
+        self.stdout.write(self.style.SUCCESS(
+            f"async/sync throughput: {async_result['throughput'] / sync_result['throughput']:.2f}x, "
+            f"p99: {async_result['p99_ms'] / sync_result['p99_ms']:.2f}x"
+        ))
+
+    def spawn(self, mode, options):
+        """Run one mode in a fresh process, so URL routing follows ASYNC_VIEWS"""
+        env = dict(os.environ, ASYNC_VIEWS='1' if mode == 'async' else '0')
+        command = [
+            sys.executable, sys.argv[0], 'bench_send_path', '--mode', mode,
+            '--senders', str(options['senders']),
+            '--requests', str(options['requests']),
+            '--workers', str(options['workers']),
+            '--db-latency-ms', str(options['db_latency_ms']),
+        ]
+        completed = subprocess.run(command, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise CommandError(f'{mode} run failed:\n{completed.stderr}')
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def run_mode(self, options):
+        if settings.ASYNC_VIEWS != (options['mode'] == 'async'):
+            raise CommandError('Run the benchmark without --mode; it sets ASYNC_VIEWS itself.')
+
+        latency = options['db_latency_ms'] / 1000
+
+        def delay(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_delay(sender, connection, **kwargs):
+            connection.execute_wrappers.append(delay)
+
+        # Every connection opened from here on, in any thread, pays the latency
+        connections.close_all()
+        connection_created.connect(add_delay, weak=False)
+
+        path = f'/u/{BENCH_USERNAME}/send/'
+        with override_settings(DEBUG=False):
+            if options['mode'] == 'sync':
+                latencies, errors, elapsed = self.run_sync(path, options)
+            else:
+                latencies, errors, elapsed = asyncio.run(self.run_async(path, options))
+
+        latencies.sort()
+        return {
+            'mode': options['mode'],
+            'errors': errors,
+            'throughput': len(latencies) / elapsed,
+            'p50_ms': latencies[len(latencies) // 2] * 1000,
+            'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+        }
+
+    def run_sync(self, path, options):
+        """Senders queue on a fixed pool of sync workers, like gunicorn's sync workers"""
+        from django.core.wsgi import get_wsgi_application
+        application = get_wsgi_application()
+
+        def call():
+            body = _message_body()
+            environ = {
+                'REQUEST_METHOD': 'POST',
+                'SCRIPT_NAME': '',
+                'PATH_INFO': path,
+                'QUERY_STRING': '',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'REMOTE_ADDR': _random_ip(),
+                'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+                'CONTENT_LENGTH': str(len(body)),
+                'HTTP_COOKIE': f'{settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}',
+                'HTTP_X_CSRFTOKEN': CSRF_TOKEN,
+                'wsgi.input': BytesIO(body),
+                'wsgi.url_scheme': 'http',
+                'wsgi.errors': sys.stderr,
+            }
+            statuses = []
+            response = application(environ, lambda status, headers: statuses.append(status))
+            b''.join(response)
+            response.close()
+            return int(statuses[0].split()[0])
+
+        latencies, errors = [], []
+        lock = threading.Lock()
+        per_sender = options['requests'] // options['senders']
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as workers:
+            def sender():
+                for _ in range(per_sender):
+                    start = time.perf_counter()
+                    status = workers.submit(call).result()
+                    with lock:
+                        latencies.append(time.perf_counter() - start)
+                        if status != 200:
+                            errors.append(status)
+
+            start = time.perf_counter()
+            senders = [threading.Thread(target=sender) for _ in range(options['senders'])]
+            for thread in senders:
+                thread.start()
+            for thread in senders:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+        return latencies, len(errors), elapsed
+
+    async def run_async(self, path, options):
+        """Senders share one ASGI application on one event loop, like a uvicorn worker"""
+        from django.core.asgi import get_asgi_application
+        application = get_asgi_application()
+
+        async def call():
+            body = _message_body()
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'POST',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'root_path': '',
+                'query_string': b'',
+                'client': (_random_ip(), 50000),
+                'server': ('localhost', 80),
+                'headers': [
+                    (b'host', b'localhost'),
+                    (b'content-type', b'application/x-www-form-urlencoded'),
+                    (b'content-length', str(len(body)).encode()),
+                    (b'cookie', f'{settings.CSRF_COOKIE_NAME}={CSRF_TOKEN}'.encode()),
+                    (b'x-csrftoken', CSRF_TOKEN.encode()),
+                ],
+            }
+            statuses = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+
+            async def send(event):
+                if event['type'] == 'http.response.start':
+                    statuses.append(event['status'])
+
+            await application(scope, receive, send)
+            return statuses[0]
+
+        latencies, errors = [], 0
+        per_sender = options['requests'] // options['senders']
+
+        async def sender():
+            nonlocal errors
+            for _ in range(per_sender):
+                start = time.perf_counter()
+                status = await call()
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(sender() for _ in range(options['senders'])))
+        return latencies, errors, time.perf_counter() - start
@@ -0,0 +1,99 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from messaging.models import UserProfile
+import uuid
+
+
+# SQL verbs that change data
+WRITE_PREFIXES = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay public traffic (profile page, CSRF token, send) as an anonymous '
+        'visitor and as a logged-in dashboard owner, and count the session-table '
+        'writes per request with the legacy and the current session settings. '
+        'Fails if the current settings still write sessions on public requests. '
+        'All rows are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Requests per endpoint')
+
+    def handle(self, *args, **options):
+        legacy = {
+            'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+            'SESSION_SAVE_EVERY_REQUEST': True,
+        }
+
+        failures = []
+        for label, overrides in [('legacy', legacy), ('current', {})]:
+            self.stdout.write(f'{label} session settings:')
+            results = self.run(overrides, options['requests'])
+            for name, (session_writes, other_writes) in results.items():
+                self.stdout.write(
+                    f'  {name:<34} session writes/request {session_writes:.2f}, '
+                    f'other writes/request {other_writes:.2f}'
+                )
+                if label == 'current' and session_writes:
+                    failures.append(name)
+
+        if failures:
+            raise CommandError(f'Public requests still write sessions: {", ".join(failures)}')
+
+        self.stdout.write(self.style.SUCCESS('Public requests cause no session writes.'))
+
+    def run(self, overrides, request_count):
+        """Return {scenario: (session writes, other writes)} averaged per request"""
+        results = {}
+        settings_overrides = dict(
+            overrides,
+            ALLOWED_HOSTS=['testserver'],
+            RATELIMIT_ENABLE=False,
+            MESSAGE_INGESTION_MODE='sync',
+        )
+
+        with override_settings(**settings_overrides), transaction.atomic():
+            user_profile = UserProfile.objects.create(username='__sessionbench', pin='0000')
+            profile_url = f'/u/{user_profile.username}/'
+
+            owner = Client()
+            owner.post(f'/dashboard/{user_profile.username}/auth/', {'pin': '0000'})
+            owner.get(f'/dashboard/{user_profile.username}/')
+
+            for visitor_label, client in [('anonymous', Client()), ('dashboard owner', owner)]:
+                scenarios = [
+                    ('GET profile page', lambda: client.get(profile_url)),
+                    ('GET csrf token', lambda: client.get('/csrf/')),
+                    # Distinct texts so the flood check does not reject the sends
+                    ('POST message', lambda: client.post(
+                        f'{profile_url}send/', {'message_text': f'Session benchmark {uuid.uuid4().hex}'}
+                    )),
+                ]
+                for name, send in scenarios:
+                    with CaptureQueriesContext(connection) as queries:
+                        for _ in range(request_count):
+                            send()
+                    session_writes, other_writes = self.count_writes(queries.captured_queries)
+                    results[f'{visitor_label}: {name}'] = (
+                        session_writes / request_count, other_writes / request_count
+                    )
+
+            # Never keep the benchmark rows
+            transaction.set_rollback(True)
+
+        return results
+
+    def count_writes(self, captured_queries):
+        session_writes = other_writes = 0
+        for query in captured_queries:
+            sql = query['sql'].lstrip().upper()
+            if not sql.startswith(WRITE_PREFIXES):
+                continue
+            if 'DJANGO_SESSION' in sql:
+                session_writes += 1
+            else:
+                other_writes += 1
+        return session_writes, other_writes
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from messaging import cards
+import time
+
+
+SAMPLE_TEXT = 'Honestly you were the best part of this semester, never change!'
+
+
+class Command(BaseCommand):
+    help = 'Measure per-image share card cost with cold (per-request) and warm (preloaded) fonts/background'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        # Cold: resolve fonts and draw the background on every image, as the
+        # view did before the renderer kept them per process
+        cold = self.measure(iterations, reset=True)
+
+        cards.reset_caches()
+        cards.warm_up()
+        warm = self.measure(iterations, reset=False)
+
+        self.stdout.write(f'cold (fonts + background per image): {cold * 1000:.2f} ms/image')
+        self.stdout.write(f'warm (preloaded fonts + background): {warm * 1000:.2f} ms/image')
+        self.stdout.write(self.style.SUCCESS(f'speedup: {cold / warm:.2f}x'))
+
+    def measure(self, iterations, reset):
+        start = time.perf_counter()
+        for i in range(iterations):
+            if reset:
+                cards.reset_caches()
+            cards.render_card(f'{SAMPLE_TEXT} #{i}', 'benchmark')
+        return (time.perf_counter() - start) / iterations
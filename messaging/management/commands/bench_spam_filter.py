@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from messaging.spam import SpamMatcher
+import random
+import string
+import time
+
+
+SAMPLE_MESSAGE = (
+    'Honestly I never told you this but you always made the group chat better. '
+    'Keep being yourself and good luck with the exams next week!'
+)
+
+
+class Command(BaseCommand):
+    help = 'Show per-message spam matching time as the word list grows, compared with a linear scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000])
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        iterations = options['iterations']
+
+        for size in options['sizes']:
+            words = {''.join(rng.choices(string.ascii_lowercase, k=rng.randint(5, 12))) for _ in range(size)}
+
+            matcher = SpamMatcher(words)
+            start = time.perf_counter()
+            for _ in range(iterations):
+                matcher.search(SAMPLE_MESSAGE)
+            compiled = (time.perf_counter() - start) / iterations
+
+            lowered_words = list(words)
+            start = time.perf_counter()
+            for _ in range(iterations):
+                lowered = SAMPLE_MESSAGE.lower()
+                any(word in lowered for word in lowered_words)
+            linear = (time.perf_counter() - start) / iterations
+
+            self.stdout.write(
+                f'{size:>6} words: automaton {compiled * 1e6:8.1f} us/message, '
+                f'linear scan {linear * 1e6:8.1f} us/message'
+            )
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from messaging.deletion import delete_messages_in_chunks, run_inbox_deletion, is_stale
+from messaging.models import UserProfile, InboxDeletion
+from messaging.stats import recompute_stats
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete every message of a profile in id-range chunks, printing progress, or '
+        'with --resume finish background inbox deletions whose worker went away.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', nargs='?')
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--resume', action='store_true', help='Finish abandoned background deletions')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            self.resume()
+            return
+
+        if not options['username']:
+            raise CommandError('Give a username, or use --resume.')
+        try:
+            user_profile = UserProfile.objects.get(username=options['username'])
+        except UserProfile.DoesNotExist:
+            raise CommandError(f"No profile named {options['username']!r}.")
+
+        up_to_id = user_profile.messages.order_by('-id').values_list('id', flat=True).first() or 0
+        deleted = 0
+        start = time.perf_counter()
+
+        def progress(count):
+            nonlocal deleted
+            deleted += count
+            self.stdout.write(f'Deleted {deleted} messages ({deleted / (time.perf_counter() - start):,.0f}/s)')
+
+        delete_messages_in_chunks(user_profile.id, up_to_id, options['chunk_size'], progress)
+        user_profile.message_archives.all().delete()
+        recompute_stats(user_profile)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} messages of {user_profile.username}.'))
+
+    def resume(self):
+        jobs = [job for job in InboxDeletion.objects.filter(status='running') if is_stale(job)]
+        for job in jobs:
+            self.stdout.write(f'Resuming {job} ({job.deleted_messages}/{job.total_messages})')
+            job.updated_at = timezone.now()
+            job.save(update_fields=['updated_at'])
+            run_inbox_deletion(job)
+        self.stdout.write(self.style.SUCCESS(f'Resumed {len(jobs)} abandoned deletions.'))
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from messaging.ingest import get_message_queue
+import time
+
+
+class Command(BaseCommand):
+    help = 'Write messages waiting in the local ingestion journal to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep flushing every MESSAGE_QUEUE_MAX_DELAY seconds')
+
+    def handle(self, *args, **options):
+        queue = get_message_queue()
+
+        while True:
+            flushed = queue.flush()
+            if flushed:
+                self.stdout.write(f'Flushed {flushed} queued messages')
+            if not options['loop']:
+                break
+            time.sleep(settings.MESSAGE_QUEUE_MAX_DELAY)
+
+        self.stdout.write(self.style.SUCCESS(f'{queue.pending_count()} messages still pending'))
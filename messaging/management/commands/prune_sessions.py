@@ -0,0 +1,39 @@
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired rows from django_session in small batches. Unlike '
+        'clearsessions, this never issues one huge DELETE, so it is safe to run from '
+        'cron against a table bloated by SESSION_SAVE_EVERY_REQUEST. '
+        'A no-op with the signed_cookies session engine.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+        total = 0
+
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now)
+                .values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                break
+
+            deleted, _ = Session.objects.filter(session_key__in=keys).delete()
+            total += deleted
+            self.stdout.write(f'Deleted {total} expired sessions so far')
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {total} expired sessions.'))
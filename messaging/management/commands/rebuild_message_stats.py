@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from messaging.models import UserProfile, ProfileStats
+from messaging.pagination import iter_by_id
+from messaging.stats import recompute_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-profile message counters and report the ones that had drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only rebuild these profiles')
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.all()
+        if options['usernames']:
+            profiles = profiles.filter(username__in=options['usernames'])
+
+        rebuilt = drifted = 0
+        for user_profile in iter_by_id(profiles, chunk_size=500):
+            before = ProfileStats.objects.filter(user=user_profile).values(
+                'total_messages', 'unread_messages', 'daily_counts'
+            ).first()
+            stats = recompute_stats(user_profile)
+            after = {
+                'total_messages': stats.total_messages,
+                'unread_messages': stats.unread_messages,
+                'daily_counts': stats.daily_counts,
+            }
+
+            rebuilt += 1
+            if before != after:
+                drifted += 1
+                self.stdout.write(f'Fixed counters for @{user_profile.username}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt stats for {rebuilt} profiles ({drifted} had drifted)'
+        ))
@@ -0,0 +1,34 @@
+from django.conf import settings
+import time
+
+
+class SessionRefreshMiddleware:
+    """
+    Keep dashboard sessions sliding without saving them on every request.
+
+    SESSION_SAVE_EVERY_REQUEST made every hit that carried a session cookie
+    write to the session store. With it turned off, a session that this
+    request actually read is saved again only once SESSION_REFRESH_INTERVAL
+    seconds have passed since its last save. That keeps the
+    SESSION_COOKIE_AGE inactivity timeout and costs at most one write per
+    interval. Requests that never touch request.session, such as the public
+    profile and send endpoints, are left alone.
+
+    Must be listed after SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        session = getattr(request, 'session', None)
+        if session is None or not session.accessed or session.is_empty():
+            return response
+
+        # A session that is being saved anyway restarts the interval for free
+        now = int(time.time())
+        if session.modified or now - session.get('_refreshed_at', 0) >= settings.SESSION_REFRESH_INTERVAL:
+            session['_refreshed_at'] = now
+        return response
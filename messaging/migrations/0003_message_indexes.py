@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_profilestats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='message_user_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('status', 'unread')), fields=['user', '-timestamp'], name='message_user_unread_idx'),
+        ),
+    ]
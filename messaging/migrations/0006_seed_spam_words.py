@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:31
+
+from django.db import migrations
+
+
+# Words that used to be hard-coded in SendMessageForm.clean_message_text
+INITIAL_SPAM_WORDS = ['viagra', 'casino', 'lottery', 'winner']
+
+
+def seed_spam_words(apps, schema_editor):
+    SpamWord = apps.get_model('messaging', 'SpamWord')
+    for word in INITIAL_SPAM_WORDS:
+        SpamWord.objects.get_or_create(word=word)
+
+
+def unseed_spam_words(apps, schema_editor):
+    SpamWord = apps.get_model('messaging', 'SpamWord')
+    SpamWord.objects.filter(word__in=INITIAL_SPAM_WORDS).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0005_spamword'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_spam_words, unseed_spam_words),
+    ]
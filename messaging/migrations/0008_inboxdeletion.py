@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0007_message_user_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('up_to_id', models.BigIntegerField()),
+                ('total_messages', models.PositiveIntegerField(default=0)),
+                ('deleted_messages', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='running', max_length=10)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_deletions', to='messaging.userprofile')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,96 @@
+from django.db import migrations
+
+
+# The first search schema, frozen here: the message text alone is indexed.
+# 0011_message_search_by_user replaces it with one that covers the owner too.
+
+SQLITE_FORWARDS = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messaging_message_fts USING fts5(
+        message_text, content='messaging_message', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messaging_message_fts_insert AFTER INSERT ON messaging_message BEGIN
+        INSERT INTO messaging_message_fts(rowid, message_text) VALUES (new.id, new.message_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messaging_message_fts_delete AFTER DELETE ON messaging_message BEGIN
+        INSERT INTO messaging_message_fts(messaging_message_fts, rowid, message_text)
+        VALUES ('delete', old.id, old.message_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messaging_message_fts_update AFTER UPDATE OF message_text ON messaging_message BEGIN
+        INSERT INTO messaging_message_fts(messaging_message_fts, rowid, message_text)
+        VALUES ('delete', old.id, old.message_text);
+        INSERT INTO messaging_message_fts(rowid, message_text) VALUES (new.id, new.message_text);
+    END
+    """,
+    # Index the messages that already exist
+    "INSERT INTO messaging_message_fts(messaging_message_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARDS = [
+    'DROP TRIGGER IF EXISTS messaging_message_fts_insert',
+    'DROP TRIGGER IF EXISTS messaging_message_fts_delete',
+    'DROP TRIGGER IF EXISTS messaging_message_fts_update',
+    'DROP TABLE IF EXISTS messaging_message_fts',
+]
+
+# CONCURRENTLY keeps inserts flowing while the index is built; it cannot run
+# inside a transaction, hence atomic = False below
+POSTGRES_FORWARDS = [
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS message_text_search_idx ON messaging_message
+    USING gin (to_tsvector('simple', message_text))
+    """,
+]
+
+POSTGRES_BACKWARDS = [
+    'DROP INDEX CONCURRENTLY IF EXISTS message_text_search_idx',
+]
+
+
+def drop_invalid_index(schema_editor, name):
+    # An interrupted CREATE INDEX CONCURRENTLY leaves an invalid index behind,
+    # which IF NOT EXISTS would then keep
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)', [name])
+        row = cursor.fetchone()
+    if row and row[0]:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = SQLITE_FORWARDS
+    elif vendor == 'postgresql':
+        drop_invalid_index(schema_editor, 'message_text_search_idx')
+        statements = POSTGRES_FORWARDS
+    else:
+        statements = []
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    statements = {'sqlite': SQLITE_BACKWARDS, 'postgresql': POSTGRES_BACKWARDS}
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('messaging', '0009_messagearchive'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
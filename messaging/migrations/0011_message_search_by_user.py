@@ -0,0 +1,156 @@
+from django.db import migrations
+
+
+# The per-profile search schema, frozen here: the owner is indexed next to
+# the words, so a search intersects the two inside the index. Replaces the
+# text-only schema of 0010_message_search.
+
+SQLITE_DROP_TEXT_ONLY = [
+    'DROP TRIGGER IF EXISTS messaging_message_fts_insert',
+    'DROP TRIGGER IF EXISTS messaging_message_fts_delete',
+    'DROP TRIGGER IF EXISTS messaging_message_fts_update',
+    'DROP TABLE IF EXISTS messaging_message_fts',
+]
+
+# The view gives FTS5 the owner column when it reads the content back
+SQLITE_FORWARDS = SQLITE_DROP_TEXT_ONLY + [
+    """
+    CREATE VIEW IF NOT EXISTS messaging_message_fts_content AS
+    SELECT id, message_text, user_id FROM messaging_message
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messaging_message_fts USING fts5(
+        message_text, user_id, content='messaging_message_fts_content', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messaging_message_fts_insert AFTER INSERT ON messaging_message BEGIN
+        INSERT INTO messaging_message_fts(rowid, message_text, user_id) VALUES (new.id, new.message_text, new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messaging_message_fts_delete AFTER DELETE ON messaging_message BEGIN
+        INSERT INTO messaging_message_fts(messaging_message_fts, rowid, message_text, user_id)
+        VALUES ('delete', old.id, old.message_text, old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messaging_message_fts_update AFTER UPDATE OF message_text, user_id ON messaging_message BEGIN
+        INSERT INTO messaging_message_fts(messaging_message_fts, rowid, message_text, user_id)
+        VALUES ('delete', old.id, old.message_text, old.user_id);
+        INSERT INTO messaging_message_fts(rowid, message_text, user_id) VALUES (new.id, new.message_text, new.user_id);
+    END
+    """,
+    "INSERT INTO messaging_message_fts(messaging_message_fts) VALUES ('rebuild')",
+]
+
+# Back to the text-only schema of 0010
+SQLITE_BACKWARDS = SQLITE_DROP_TEXT_ONLY + [
+    'DROP VIEW IF EXISTS messaging_message_fts_content',
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messaging_message_fts USING fts5(
+        message_text, content='messaging_message', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messaging_message_fts_insert AFTER INSERT ON messaging_message BEGIN
+        INSERT INTO messaging_message_fts(rowid, message_text) VALUES (new.id, new.message_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messaging_message_fts_delete AFTER DELETE ON messaging_message BEGIN
+        INSERT INTO messaging_message_fts(messaging_message_fts, rowid, message_text)
+        VALUES ('delete', old.id, old.message_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messaging_message_fts_update AFTER UPDATE OF message_text ON messaging_message BEGIN
+        INSERT INTO messaging_message_fts(messaging_message_fts, rowid, message_text)
+        VALUES ('delete', old.id, old.message_text);
+        INSERT INTO messaging_message_fts(rowid, message_text) VALUES (new.id, new.message_text);
+    END
+    """,
+    "INSERT INTO messaging_message_fts(messaging_message_fts) VALUES ('rebuild')",
+]
+
+# GIN over the bigint user_id needs the btree_gin extension, which is a
+# prerequisite (see the README) rather than created here. The new index is
+# built before the old one is dropped, both without blocking writes.
+POSTGRES_FORWARDS = [
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS message_user_text_search_idx ON messaging_message
+    USING gin (user_id, to_tsvector('simple', message_text))
+    """,
+    'DROP INDEX CONCURRENTLY IF EXISTS message_text_search_idx',
+]
+
+POSTGRES_BACKWARDS = [
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS message_text_search_idx ON messaging_message
+    USING gin (to_tsvector('simple', message_text))
+    """,
+    'DROP INDEX CONCURRENTLY IF EXISTS message_user_text_search_idx',
+]
+
+
+def drop_invalid_index(schema_editor, name):
+    # An interrupted CREATE INDEX CONCURRENTLY leaves an invalid index behind,
+    # which IF NOT EXISTS would then keep
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)', [name])
+        row = cursor.fetchone()
+    if row and row[0]:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+def require_btree_gin(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'btree_gin'")
+        installed = cursor.fetchone() is not None
+    if not installed:
+        raise RuntimeError(
+            'The btree_gin extension is required: run "CREATE EXTENSION IF NOT EXISTS btree_gin;" '
+            'as the database owner, then migrate again.'
+        )
+
+
+def index_search_by_user(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = SQLITE_FORWARDS
+    elif vendor == 'postgresql':
+        require_btree_gin(schema_editor)
+        drop_invalid_index(schema_editor, 'message_user_text_search_idx')
+        statements = POSTGRES_FORWARDS
+    else:
+        statements = []
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def index_search_by_text(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = SQLITE_BACKWARDS
+    elif vendor == 'postgresql':
+        drop_invalid_index(schema_editor, 'message_text_search_idx')
+        statements = POSTGRES_BACKWARDS
+    else:
+        statements = []
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('messaging', '0010_message_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_search_by_user, index_search_by_text),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.utils import timezone
 import random
 import hashlib
+import ipaddress
 
 
 class UserProfile(models.Model):
@@ -45,6 +46,18 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Inbox listing: filtered by user, newest first, id as tie-breaker
+            models.Index(fields=['user', '-timestamp', '-id'], name='message_user_timestamp_idx'),
+            # Live updates: messages newer than the last id a dashboard has seen
+            models.Index(fields=['user', 'id'], name='message_user_id_idx'),
+            # Mark-as-read and unread counts only ever touch unread rows
+            models.Index(
+                fields=['user', '-timestamp'],
+                condition=models.Q(status='unread'),
+                name='message_user_unread_idx',
+            ),
+        ]
     
     def __str__(self):
         return f"Message to {self.user.username} at {self.timestamp}"
@@ -61,10 +74,133 @@ class Message(models.Model):
 
 
 class BlockedIP(models.Model):
-    """Blocked IP addresses for spam prevention"""
+    """Blocked IP addresses or network prefixes for spam prevention"""
+    # Prefix lengths that can be blocked, per IP version. Lookups hash the
+    # client's network at each of these lengths, so the cost of a check does
+    # not depend on how many entries the blocklist holds.
+    PREFIX_LENGTHS = {
+        4: (24, 16),
+        6: (64, 48),
+    }
+    
     ip_hash = models.CharField(max_length=64, unique=True)
+    # Null for a single address, otherwise the length of the blocked network
+    prefix_length = models.PositiveSmallIntegerField(blank=True, null=True)
     blocked_at = models.DateTimeField(default=timezone.now)
     reason = models.CharField(max_length=200, default='Spam')
     
     def __str__(self):
+        if self.prefix_length:
+            return f"Blocked /{self.prefix_length} network at {self.blocked_at}"
         return f"Blocked IP at {self.blocked_at}"
+    
+    @staticmethod
+    def hash_network(network):
+        """Hash a normalized network such as '203.0.113.0/24'"""
+        return hashlib.sha256(str(network).encode()).hexdigest()
+    
+    @staticmethod
+    def parse_address(ip_address):
+        """Parse an address, IPv4-mapped IPv6 as IPv4; None if it is not an IP address"""
+        try:
+            address = ipaddress.ip_address(ip_address.strip())
+        except ValueError:
+            return None
+        if address.version == 6 and address.ipv4_mapped:
+            return address.ipv4_mapped
+        return address
+    
+    @classmethod
+    def hash_address(cls, ip_address):
+        """Hash a single address in its canonical form, so 2001:DB8::1 and 2001:db8:0::1 agree"""
+        address = cls.parse_address(ip_address)
+        return Message.hash_ip(str(address) if address else ip_address)
+    
+    @classmethod
+    def candidate_hashes(cls, ip_address):
+        """All hashes that would block this address: exact match plus each prefix"""
+        # Entries made before addresses were canonicalized hash the raw string
+        hashes = [Message.hash_ip(ip_address)]
+        address = cls.parse_address(ip_address)
+        if address is None:
+            return hashes
+        
+        canonical_hash = Message.hash_ip(str(address))
+        if canonical_hash != hashes[0]:
+            hashes.append(canonical_hash)
+        
+        for prefix_length in cls.PREFIX_LENGTHS[address.version]:
+            network = ipaddress.ip_network(f"{address}/{prefix_length}", strict=False)
+            hashes.append(cls.hash_network(network))
+        return hashes
+
+
+class ProfileStats(models.Model):
+    """Incrementally maintained inbox counters for a user profile"""
+    user = models.OneToOneField(UserProfile, on_delete=models.CASCADE, related_name='stats')
+    total_messages = models.PositiveIntegerField(default=0)
+    unread_messages = models.PositiveIntegerField(default=0)
+    # Message counts keyed by ISO date, limited to the analytics window
+    daily_counts = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = 'Profile stats'
+    
+    def __str__(self):
+        return f"Stats for {self.user.username}"
+
+
+class SpamWord(models.Model):
+    """Moderated word or phrase rejected in incoming messages"""
+    word = models.CharField(max_length=100, unique=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['word']
+    
+    def __str__(self):
+        return self.word
+
+
+class InboxDeletion(models.Model):
+    """Bulk deletion of an inbox, carried out in id-range chunks"""
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='inbox_deletions')
+    # Messages with an id up to this one are deleted; later arrivals are kept
+    up_to_id = models.BigIntegerField()
+    total_messages = models.PositiveIntegerField(default=0)
+    deleted_messages = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Deletion of {self.user.username}'s inbox ({self.status})"
+
+
+class MessageArchive(models.Model):
+    """Compressed batch of a profile's old messages, moved out of the inbox"""
+    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='message_archives')
+    # Time span covered by the batch
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    message_count = models.PositiveIntegerField()
+    # zlib-compressed JSON rows of the messages, oldest first (see messaging.archive)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        # Batches are written oldest messages first, so a higher id is newer
+        ordering = ['-id']
+    
+    def __str__(self):
+        return f"{self.message_count} archived messages of {self.user.username}"
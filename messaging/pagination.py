@@ -0,0 +1,100 @@
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateformat import format as format_date
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+
+# Number of messages rendered on the dashboard and returned per "load more" call
+MESSAGES_PAGE_SIZE = 20
+
+# Display format shared by the dashboard template and the JSON endpoint
+MESSAGE_TIME_FORMAT = 'M d, Y - g:i A'
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(message):
+    """Encode a message position as an opaque '<microseconds>-<id>' cursor"""
+    micros = (message.timestamp - EPOCH) // timedelta(microseconds=1)
+    return f"{micros}-{message.id}"
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into a (timestamp, id) tuple, or None if it is malformed"""
+    try:
+        micros, message_id = cursor.split('-', 1)
+        timestamp = EPOCH + timedelta(microseconds=int(micros))
+        return timestamp, int(message_id)
+    except (AttributeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def get_message_page(user_profile, before=None, page_size=MESSAGES_PAGE_SIZE):
+    """
+    Fetch one slice of a user's inbox, newest first.
+
+    Uses keyset (seek) pagination on (timestamp, id) so every page costs the
+    same regardless of how deep into the inbox the cursor points. Returns a
+    tuple of (messages, next_cursor); next_cursor is None on the last page.
+    """
+    queryset = user_profile.messages.order_by('-timestamp', '-id')
+
+    if before is not None:
+        timestamp, message_id = before
+        queryset = queryset.filter(
+            Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=message_id)
+        )
+
+    # Fetch one extra row to know whether another page exists
+    messages_list = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(messages_list) > page_size:
+        messages_list = messages_list[:page_size]
+        next_cursor = encode_cursor(messages_list[-1])
+
+    return messages_list, next_cursor
+
+
+def get_messages_since(user_profile, since_id, limit=MESSAGES_PAGE_SIZE):
+    """
+    Fetch messages newer than the last id a dashboard has seen, oldest first.
+
+    Returns a tuple of (messages, has_more); callers ask again from the last
+    returned id while has_more is True.
+    """
+    queryset = user_profile.messages.filter(id__gt=since_id).order_by('id')
+    messages_list = list(queryset[:limit + 1])
+    return messages_list[:limit], len(messages_list) > limit
+
+
+def iter_by_id(queryset, chunk_size=1000, descending=False):
+    """
+    Iterate a queryset in id order, one keyset page of chunk_size rows per query.
+
+    Use this instead of QuerySet.iterator() for reads that outlive a
+    transaction: behind a transaction-pooling proxy such as PgBouncer a
+    server-side cursor only lives as long as its transaction, while each
+    page here is a short query of its own. Rows are model instances, or
+    values_list() tuples whose first field is the id.
+    """
+    queryset = queryset.order_by('-id' if descending else 'id')
+    page = queryset
+    while True:
+        rows = list(page[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+
+        last_id = rows[-1][0] if isinstance(rows[-1], tuple) else rows[-1].pk
+        page = queryset.filter(id__lt=last_id) if descending else queryset.filter(id__gt=last_id)
+
+
+def serialize_message(message):
+    """Serialize a message for the dashboard JSON endpoints"""
+    return {
+        'id': message.id,
+        'message_text': message.message_text,
+        'timestamp': message.timestamp.isoformat(),
+        'display_time': format_date(timezone.localtime(message.timestamp), MESSAGE_TIME_FORMAT),
+        'status': message.status,
+    }
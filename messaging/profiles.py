@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+import hashlib
+from .models import UserProfile
+
+
+# Marker cached for usernames that do not exist
+MISSING = '__missing__'
+
+PROFILE_FIELDS = ['id', 'username', 'pin', 'created_at']
+
+
+def _profile_key(username):
+    # Hashed so arbitrary URL segments are always valid cache keys
+    return 'profile:' + hashlib.sha256(username.encode()).hexdigest()
+
+
+def get_profile(username):
+    """
+    Resolve a username to a UserProfile, or None if it does not exist.
+
+    Found profiles are cached for PROFILE_CACHE_TIMEOUT seconds and unknown
+    names for PROFILE_NEGATIVE_CACHE_TIMEOUT seconds, so repeated hits and
+    bots probing random /u/<name>/ URLs need no query at all. The cached
+    snapshot is rebuilt into a regular model instance, so related managers
+    such as user_profile.messages keep working.
+    """
+    key = _profile_key(username)
+    snapshot = cache.get(key)
+
+    if snapshot is None:
+        snapshot = UserProfile.objects.filter(username=username).values(*PROFILE_FIELDS).first()
+        cache.set(key, *_cache_entry(snapshot))
+
+    return _from_snapshot(snapshot)
+
+
+async def aget_profile(username):
+    """Async version of get_profile using the async ORM"""
+    key = _profile_key(username)
+    snapshot = await cache.aget(key)
+
+    if snapshot is None:
+        snapshot = await UserProfile.objects.filter(username=username).values(*PROFILE_FIELDS).afirst()
+        await cache.aset(key, *_cache_entry(snapshot))
+
+    return _from_snapshot(snapshot)
+
+
+def _cache_entry(snapshot):
+    """Value and timeout to cache for a lookup result"""
+    if snapshot is None:
+        return MISSING, settings.PROFILE_NEGATIVE_CACHE_TIMEOUT
+    return snapshot, settings.PROFILE_CACHE_TIMEOUT
+
+
+def _from_snapshot(snapshot):
+    if snapshot is None or snapshot == MISSING:
+        return None
+    return UserProfile.from_db('default', PROFILE_FIELDS, [snapshot[field] for field in PROFILE_FIELDS])
+
+
+def get_profile_or_404(username):
+    """Cached equivalent of get_object_or_404(UserProfile, username=username)"""
+    user_profile = get_profile(username)
+    if user_profile is None:
+        raise Http404('No UserProfile matches the given query.')
+    return user_profile
+
+
+async def aget_profile_or_404(username):
+    """Async version of get_profile_or_404"""
+    user_profile = await aget_profile(username)
+    if user_profile is None:
+        raise Http404('No UserProfile matches the given query.')
+    return user_profile
+
+
+def invalidate_profile(username):
+    """Drop the cached snapshot (or negative entry) for a username"""
+    cache.delete(_profile_key(username))
@@ -0,0 +1,162 @@
+"""
+Sliding-window rate limiting shared by every worker on the host.
+
+Counters live in a small SQLite file (RATELIMIT_STORE_PATH) instead of the
+per-process LocMemCache, so a limit of 5/m means 5/m no matter which
+gunicorn worker a request lands on. Each decision is one atomic UPSERT plus
+one primary-key read; expired windows are purged in batches.
+"""
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from django.utils.module_loading import import_string
+from django_ratelimit import ALL
+from django_ratelimit.core import _SIMPLE_KEYS, _method_match, _split_rate
+from django_ratelimit.exceptions import Ratelimited
+from functools import wraps
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+# Seconds between purges of expired windows, per process
+EXPIRY_INTERVAL = 60
+
+
+class SlidingWindowStore:
+    """Atomic hit counters in a SQLite file, evaluated as sliding windows"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._last_expiry = 0
+
+    def _connection(self):
+        # One connection per thread and per process (never reuse across fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS hits ('
+                ' key TEXT NOT NULL,'
+                ' window INTEGER NOT NULL,'
+                ' count INTEGER NOT NULL,'
+                ' expires_at REAL NOT NULL,'
+                ' PRIMARY KEY (key, window)'
+                ') WITHOUT ROWID'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS hits_expires_at ON hits (expires_at)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def hit(self, key, period, now=None):
+        """
+        Record a hit and return the sliding-window count including it.
+
+        The count is the current fixed window plus the previous window
+        weighted by how much of it still overlaps the last `period` seconds.
+        """
+        now = time.time() if now is None else now
+        window = int(now // period)
+        conn = self._connection()
+
+        # The UPSERT is a single atomic statement, so concurrent workers
+        # can never lose an increment
+        current = conn.execute(
+            'INSERT INTO hits (key, window, count, expires_at) VALUES (?, ?, 1, ?) '
+            'ON CONFLICT (key, window) DO UPDATE SET count = count + 1 '
+            'RETURNING count',
+            (key, window, (window + 2) * period),
+        ).fetchone()[0]
+        row = conn.execute(
+            'SELECT count FROM hits WHERE key = ? AND window = ?', (key, window - 1)
+        ).fetchone()
+        previous = row[0] if row else 0
+
+        self._expire(conn, now)
+
+        overlap = 1 - (now - window * period) / period
+        return current + previous * overlap
+
+    def _expire(self, conn, now):
+        if now - self._last_expiry < EXPIRY_INTERVAL:
+            return
+        self._last_expiry = now
+        conn.execute('DELETE FROM hits WHERE expires_at < ?', (now,))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_ratelimit_store():
+    """Process-wide store configured from settings"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SlidingWindowStore(settings.RATELIMIT_STORE_PATH)
+        return _store
+
+
+def _group_for(fn):
+    return f"{fn.__module__}.{fn.__qualname__}"
+
+
+def is_ratelimited(request, group, key, rate, method=ALL):
+    """Count this request against the limit and report whether it is over it"""
+    if not getattr(settings, 'RATELIMIT_ENABLE', True):
+        return False
+    if not _method_match(request, method):
+        return False
+
+    limit, period = _split_rate(rate)
+    value = key(group, request) if callable(key) else _SIMPLE_KEYS[key](request)
+    store_key = hashlib.sha256(f"{group}:{limit}/{period}:{value}".encode()).hexdigest()
+
+    try:
+        count = get_ratelimit_store().hit(store_key, period)
+    except sqlite3.Error:
+        # Same default as django-ratelimit: fail closed unless told otherwise
+        return not getattr(settings, 'RATELIMIT_FAIL_OPEN', False)
+    return count > limit
+
+
+def ratelimit(group=None, key=None, rate=None, method=ALL, block=True):
+    """
+    Drop-in replacement for django_ratelimit's decorator using the shared store.
+
+    Sets request.limited and raises RATELIMIT_EXCEPTION_CLASS when blocking,
+    exactly like the original decorator. Async views are supported; the store
+    is then hit from a worker thread so the event loop never waits on SQLite.
+    """
+    def decorator(fn):
+        limit_group = group or _group_for(fn)
+
+        def _apply(request, ratelimited):
+            old_limited = getattr(request, 'limited', False)
+            request.limited = ratelimited or old_limited
+            if ratelimited and block:
+                cls = getattr(settings, 'RATELIMIT_EXCEPTION_CLASS', Ratelimited)
+                raise (import_string(cls) if isinstance(cls, str) else cls)()
+
+        if asyncio.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def _wrapped(request, *args, **kw):
+                ratelimited = await sync_to_async(is_ratelimited, thread_sensitive=False)(
+                    request, limit_group, key, rate, method
+                )
+                _apply(request, ratelimited)
+                return await fn(request, *args, **kw)
+            return _wrapped
+
+        @wraps(fn)
+        def _wrapped(request, *args, **kw):
+            _apply(request, is_ratelimited(request, limit_group, key, rate, method))
+            return fn(request, *args, **kw)
+        return _wrapped
+    return decorator
@@ -0,0 +1,169 @@
+"""
+Full-text search over a profile's messages.
+
+SQLite (local development and tests) keeps an external-content FTS5 table,
+messaging_message_fts, whose rowids are message ids. Triggers on
+messaging_message keep it in sync on insert, delete and text updates, so
+every write path (the ORM, bulk_create from the ingest queue, the chunked
+raw deletes and the archiver) is covered without application code.
+PostgreSQL needs no extra table: a GIN index over
+(user_id, to_tsvector('simple', message_text)), through the btree_gin
+extension, is maintained by the database itself.
+
+Both indexes cover the owner as well as the words, so a query intersects
+the profile's entry with the words' entries inside the index (FTS5 can
+skip through long entries) and ranks only the profile's matches; a word
+common across all inboxes does not turn into a row lookup per message.
+
+Archived messages (messaging.archive) are compressed blobs outside the
+Message table and are not searched; the dashboard says so.
+"""
+from django.db import connection
+from django.db.models import Q
+import re
+from .models import Message
+from .pagination import MESSAGES_PAGE_SIZE
+
+
+# No stemming or stop words: messages come in any language
+SEARCH_CONFIG = 'simple'
+FTS_TABLE = 'messaging_message_fts'
+MAX_SEARCH_TERMS = 8
+
+# The owner is indexed as a column of its own; the view gives FTS5 that
+# column when it reads the content back (for a rebuild)
+SQLITE_SEARCH_SQL = [
+    f"""
+    CREATE VIEW IF NOT EXISTS {FTS_TABLE}_content AS
+    SELECT id, message_text, user_id FROM messaging_message
+    """,
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        message_text, user_id, content='{FTS_TABLE}_content', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON messaging_message BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, message_text, user_id) VALUES (new.id, new.message_text, new.user_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON messaging_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message_text, user_id)
+        VALUES ('delete', old.id, old.message_text, old.user_id);
+    END
+    """,
+    # Status changes (mark as read) do not touch the index
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF message_text, user_id ON messaging_message BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message_text, user_id)
+        VALUES ('delete', old.id, old.message_text, old.user_id);
+        INSERT INTO {FTS_TABLE}(rowid, message_text, user_id) VALUES (new.id, new.message_text, new.user_id);
+    END
+    """,
+]
+SQLITE_TRIGGER_COUNT = 3
+
+
+def _sqlite_triggers(cursor):
+    cursor.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'messaging_message' "
+        "AND name LIKE %s",
+        [f'{FTS_TABLE}_%'],
+    )
+    return cursor.fetchone()[0]
+
+
+def ensure_search_index(using_connection=None):
+    """
+    Restore the SQLite search triggers, and reindex, if a migration dropped them.
+
+    Idempotent. SQLite drops a table's triggers whenever a migration
+    rebuilds the table, so this runs after every migrate. The schema itself
+    is created by the migrations (0011_message_search_by_user), which keep
+    their own frozen copy of this SQL; PostgreSQL needs nothing here.
+    """
+    using_connection = using_connection or connection
+    if using_connection.vendor != 'sqlite':
+        return
+    with using_connection.cursor() as cursor:
+        intact = _sqlite_triggers(cursor) == SQLITE_TRIGGER_COUNT
+        for sql in SQLITE_SEARCH_SQL:
+            cursor.execute(sql)
+        if not intact:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def parse_terms(query):
+    """Lowercased words of a search query; operators and punctuation are ignored"""
+    return re.findall(r'[^\W_]+', query.lower())[:MAX_SEARCH_TERMS]
+
+
+def _search_sqlite(user_id, terms, limit, offset):
+    # Every term must match; the last one also as a prefix, for partial words.
+    # The owner is part of the MATCH, so FTS5 intersects it with the terms
+    words = ' '.join(f'"{term}"' for term in terms) + '*'
+    match = f'user_id : "{int(user_id)}" AND message_text : ({words})'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT rowid FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH %s
+            ORDER BY bm25({FTS_TABLE}, 1.0, 0.0), rowid DESC
+            LIMIT %s OFFSET %s
+            """,
+            [match, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_postgres(user_id, terms, limit, offset):
+    # Same semantics as the FTS5 query; user_id and the expression match the index
+    query = ' & '.join(terms) + ':*'
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT id FROM messaging_message
+            WHERE user_id = %s
+              AND to_tsvector('{SEARCH_CONFIG}', message_text) @@ to_tsquery('{SEARCH_CONFIG}', %s)
+            ORDER BY ts_rank(to_tsvector('{SEARCH_CONFIG}', message_text), to_tsquery('{SEARCH_CONFIG}', %s)) DESC,
+                     id DESC
+            LIMIT %s OFFSET %s
+            """,
+            [user_id, query, query, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_fallback(user_id, terms, limit, offset):
+    # Other databases: unindexed, newest first
+    condition = Q()
+    for term in terms:
+        condition &= Q(message_text__icontains=term)
+    messages = Message.objects.filter(condition, user_id=user_id).order_by('-timestamp', '-id')
+    return list(messages.values_list('id', flat=True)[offset:offset + limit])
+
+
+def search_messages(user_profile, query, page=1, page_size=MESSAGES_PAGE_SIZE):
+    """
+    Find a profile's messages matching every word of the query, best match first.
+
+    Returns a tuple of (messages, has_next) for the 1-based page.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return [], False
+
+    search = {
+        'sqlite': _search_sqlite,
+        'postgresql': _search_postgres,
+    }.get(connection.vendor, _search_fallback)
+
+    # Fetch one extra id to know whether another page exists
+    ids = search(user_profile.id, terms, page_size + 1, (page - 1) * page_size)
+    has_next = len(ids) > page_size
+    ids = ids[:page_size]
+
+    messages_by_id = Message.objects.in_bulk(ids)
+    return [messages_by_id[message_id] for message_id in ids if message_id in messages_by_id], has_next
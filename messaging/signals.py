@@ -0,0 +1,45 @@
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+from .availability import remember_username
+from .blocklist import bump_blocklist_version
+from .models import UserProfile, BlockedIP, SpamWord
+from .profiles import invalidate_profile
+from .search import ensure_search_index
+from .spam import bump_spam_words_version
+
+
+@receiver([post_save, post_delete], sender=BlockedIP)
+def invalidate_blocklist(sender, **kwargs):
+    """Make workers reload the blocklist after it changes (including via the admin)"""
+    bump_blocklist_version()
+
+
+@receiver([post_save, post_delete], sender=SpamWord)
+def invalidate_spam_matcher(sender, **kwargs):
+    """Make workers recompile the spam matcher after the word list changes"""
+    bump_spam_words_version()
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    """Forget cached lookups (including negative ones) when a profile changes"""
+    invalidate_profile(instance.username)
+
+
+@receiver(post_save, sender=UserProfile)
+def remember_taken_username(sender, instance, created, **kwargs):
+    """Make this worker's availability filter see a new profile without waiting for its refresh"""
+    if created:
+        remember_username(instance)
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, app_config, using, **kwargs):
+    """Recreate the search triggers that SQLite drops when a migration rebuilds the message table"""
+    if app_config.name != 'messaging':
+        return
+    connection = connections[using]
+    if ('messaging', '0011_message_search_by_user') in MigrationRecorder(connection).applied_migrations():
+        ensure_search_index(connection)
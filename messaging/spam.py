@@ -0,0 +1,148 @@
+from django.conf import settings
+from django.core.cache import cache
+from collections import deque
+import threading
+import time
+import unicodedata
+from .models import SpamWord
+
+
+SPAM_WORDS_VERSION_KEY = 'spamwords:version'
+
+# Common character substitutions used to dodge word filters
+LEET_MAP = str.maketrans({
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't',
+    '@': 'a', '$': 's', '!': 'i', '|': 'l',
+})
+
+
+def normalize_text(text):
+    """
+    Reduce text to the form spam words are matched in.
+
+    Accents are stripped, leetspeak is mapped back to letters and every run
+    of whitespace and punctuation becomes a single space. Runs of
+    single-character words are joined back together, so 'V 1 @ g r a'
+    normalizes to 'viagra' while ordinary words stay apart.
+    """
+    text = unicodedata.normalize('NFKD', text).lower().translate(LEET_MAP)
+    text = ''.join(ch if ch.isalnum() else ' ' for ch in text if not unicodedata.combining(ch))
+
+    tokens = []
+    spaced_out = ''
+    for token in text.split():
+        if len(token) == 1:
+            spaced_out += token
+            continue
+        if spaced_out:
+            tokens.append(spaced_out)
+            spaced_out = ''
+        tokens.append(token)
+    if spaced_out:
+        tokens.append(spaced_out)
+    return ' '.join(tokens)
+
+
+class SpamMatcher:
+    """
+    Aho-Corasick automaton over the normalized spam word list.
+
+    Matching walks the message once, so its cost depends on the message
+    length and not on how many words are in the list. Words only match at
+    the start of a word of the message: 'casinos' is caught, 'the raw
+    inner voice' does not contain 'winner'.
+    """
+
+    def __init__(self, words):
+        self._goto = [{}]
+        self._fail = [0]
+        self._match = [False]
+
+        for word in words:
+            self._add(normalize_text(word))
+        self._build_failure_links()
+
+    def _add(self, word):
+        if not word:
+            return
+        # The leading space anchors the word to a word boundary
+        word = ' ' + word
+        node = 0
+        for ch in word:
+            child = self._goto[node].get(ch)
+            if child is None:
+                child = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._match.append(False)
+                self._goto[node][ch] = child
+            node = child
+        self._match[node] = True
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                # A node also matches if any of its suffixes is a word
+                self._match[child] = self._match[child] or self._match[self._fail[child]]
+
+    def search(self, text):
+        """Return True if any spam word occurs in the text"""
+        goto, fail, match = self._goto, self._fail, self._match
+        node = 0
+        for ch in ' ' + normalize_text(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if match[node]:
+                return True
+        return False
+
+
+_matcher = None
+_matcher_version = None
+_matcher_loaded_at = 0
+_rebuild_lock = threading.Lock()
+
+
+def bump_spam_words_version():
+    """Make every worker rebuild its matcher"""
+    try:
+        cache.incr(SPAM_WORDS_VERSION_KEY)
+    except ValueError:
+        cache.set(SPAM_WORDS_VERSION_KEY, int(time.time() * 1000), None)
+
+
+def _is_stale(version):
+    return (_matcher is None or _matcher_version != version
+            or time.monotonic() - _matcher_loaded_at > settings.SPAM_WORDS_MAX_AGE)
+
+
+def get_spam_matcher():
+    """Compiled matcher for the current word list, rebuilt only when it changes"""
+    global _matcher, _matcher_version, _matcher_loaded_at
+    version = cache.get(SPAM_WORDS_VERSION_KEY, 0)
+
+    if _is_stale(version):
+        with _rebuild_lock:
+            if _is_stale(version):
+                # A plain list: a server-side cursor would not survive the
+                # transaction-pooling proxy outside a transaction
+                words = list(SpamWord.objects.values_list('word', flat=True))
+                _matcher = SpamMatcher(words)
+                _matcher_version = version
+                _matcher_loaded_at = time.monotonic()
+
+    return _matcher
+
+
+def contains_spam(text):
+    """Check a message against the moderated word list"""
+    return get_spam_matcher().search(text)
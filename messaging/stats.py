@@ -0,0 +1,179 @@
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+from .models import ProfileStats
+
+
+# Number of daily buckets kept per profile (today plus the previous six days)
+STATS_WINDOW_DAYS = 7
+
+
+def _day_start(day):
+    """Return the aware datetime at which a local calendar day begins"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _prune_buckets(daily_counts, today):
+    """Drop daily buckets that have fallen out of the analytics window"""
+    oldest = (today - timedelta(days=STATS_WINDOW_DAYS - 1)).isoformat()
+    return {day: count for day, count in daily_counts.items() if day >= oldest and count > 0}
+
+
+def recompute_stats(user_profile):
+    """
+    Rebuild a profile's counters from its messages in a single query.
+
+    Every counter is a conditional aggregate over the same scan, and the
+    daily buckets use timestamp ranges instead of a __date lookup so the
+    (user, timestamp) index can serve them.
+    """
+    today = timezone.localdate()
+
+    aggregates = {
+        'total': Count('id'),
+        'unread': Count('id', filter=Q(status='unread')),
+    }
+    days = [today - timedelta(days=offset) for offset in range(STATS_WINDOW_DAYS)]
+    for offset, day in enumerate(days):
+        start = _day_start(day)
+        aggregates[f'day_{offset}'] = Count(
+            'id', filter=Q(timestamp__gte=start, timestamp__lt=start + timedelta(days=1))
+        )
+
+    result = user_profile.messages.order_by().aggregate(**aggregates)
+    daily_counts = {
+        day.isoformat(): result[f'day_{offset}']
+        for offset, day in enumerate(days)
+        if result[f'day_{offset}']
+    }
+
+    stats, _ = ProfileStats.objects.update_or_create(
+        user=user_profile,
+        defaults={
+            'total_messages': result['total'],
+            'unread_messages': result['unread'],
+            'daily_counts': daily_counts,
+        }
+    )
+    return stats
+
+
+def get_profile_stats(user_profile):
+    """Get a profile's counters, computing them once if they do not exist yet"""
+    try:
+        return ProfileStats.objects.get(user=user_profile)
+    except ProfileStats.DoesNotExist:
+        return recompute_stats(user_profile)
+
+
+def summarize_stats(stats):
+    """Return the dashboard header numbers from a stats record"""
+    today = timezone.localdate()
+    daily_counts = _prune_buckets(stats.daily_counts, today)
+
+    return {
+        'total_messages': stats.total_messages,
+        'unread_messages': stats.unread_messages,
+        'today_messages': daily_counts.get(today.isoformat(), 0),
+        'week_messages': sum(daily_counts.values()),
+    }
+
+
+def _locked_stats(user_profile):
+    """Fetch the stats row for update, or None if it has not been built yet"""
+    return ProfileStats.objects.select_for_update().filter(user=user_profile).first()
+
+
+def record_message_sent(user_profile, message):
+    """Update counters after a message has been stored"""
+    record_messages_sent(user_profile, [message])
+
+
+def _add_messages(stats, messages_list, today):
+    daily_counts = dict(stats.daily_counts)
+    for message in messages_list:
+        day = timezone.localdate(message.timestamp).isoformat()
+        daily_counts[day] = daily_counts.get(day, 0) + 1
+
+        stats.total_messages += 1
+        if message.status == 'unread':
+            stats.unread_messages += 1
+    stats.daily_counts = _prune_buckets(daily_counts, today)
+
+
+def record_messages_sent(user_profile, messages_list):
+    """Update counters after a batch of messages for one profile has been stored"""
+    with transaction.atomic():
+        stats = _locked_stats(user_profile)
+        if stats is None:
+            # The recompute already includes the new messages
+            recompute_stats(user_profile)
+            return
+
+        _add_messages(stats, messages_list, timezone.localdate())
+        stats.save()
+
+
+def record_batch_sent(profiles, messages_by_profile):
+    """
+    Update the counters of every recipient of a stored batch.
+
+    messages_by_profile maps profile ids (keys of profiles) to their new
+    messages. The stats rows are locked in one query and saved in one bulk
+    UPDATE, however many recipients the batch has.
+    """
+    with transaction.atomic():
+        # Locked in id order, so concurrent batches cannot deadlock
+        locked = ProfileStats.objects.select_for_update().filter(
+            user_id__in=messages_by_profile
+        ).order_by('user_id')
+        stats_by_user = {stats.user_id: stats for stats in locked}
+
+        today = timezone.localdate()
+        now = timezone.now()
+        for user_id, messages_list in messages_by_profile.items():
+            stats = stats_by_user.get(user_id)
+            if stats is None:
+                recompute_stats(profiles[user_id])
+                continue
+            _add_messages(stats, messages_list, today)
+            # bulk_update does not apply auto_now; the live hub watches this field
+            stats.updated_at = now
+
+        ProfileStats.objects.bulk_update(
+            stats_by_user.values(), ['total_messages', 'unread_messages', 'daily_counts', 'updated_at']
+        )
+
+
+def record_message_deleted(user_profile, message):
+    """Update counters after a single message has been deleted"""
+    with transaction.atomic():
+        stats = _locked_stats(user_profile)
+        if stats is None:
+            recompute_stats(user_profile)
+            return
+
+        today = timezone.localdate()
+        day = timezone.localdate(message.timestamp).isoformat()
+        daily_counts = dict(stats.daily_counts)
+        if day in daily_counts:
+            daily_counts[day] -= 1
+
+        stats.total_messages = max(stats.total_messages - 1, 0)
+        if message.status == 'unread':
+            stats.unread_messages = max(stats.unread_messages - 1, 0)
+        stats.daily_counts = _prune_buckets(daily_counts, today)
+        stats.save()
+
+
+def mark_all_read(user_profile):
+    """Mark a profile's inbox as read and reset its unread counter in one transaction"""
+    with transaction.atomic():
+        # Senders increment the counter under the same row lock, so a
+        # message stored after the UPDATE below is counted again afterwards
+        stats = _locked_stats(user_profile)
+        user_profile.messages.filter(status='unread').update(status='read')
+        if stats is not None:
+            stats.unread_messages = 0
+            stats.save(update_fields=['unread_messages'])
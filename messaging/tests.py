@@ -0,0 +1,279 @@
+"""
+Run with a SQLite DATABASE_URL, e.g.
+
+    DATABASE_URL=sqlite:///test.sqlite3 python manage.py test messaging
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.db.models.signals import pre_delete, post_delete
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from unittest import skipUnless
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+from .archive import archive_user_messages
+from .deletion import delete_message_rows, delete_messages_in_chunks
+from .exports import _iter_card_messages, iter_export_messages
+from .flood import FloodWindowStore, minhash_signature
+from .models import UserProfile, Message
+from .pagination import get_message_page, decode_cursor, iter_by_id
+from .stats import recompute_stats
+
+
+# Markers in SQLite's EXPLAIN QUERY PLAN output that mean an index was not used
+BAD_PLAN_MARKERS = ['USE TEMP B-TREE']
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite-specific')
+class QueryPlanTests(TestCase):
+    """The Message queries the views issue are served by an index, never a scan or a sort"""
+
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        profiles = UserProfile.objects.bulk_create([
+            UserProfile(username=f'plan_{i}', pin='0000') for i in range(50)
+        ])
+        for user_profile in profiles:
+            Message.objects.bulk_create([
+                Message(
+                    user=user_profile,
+                    message_text=f'Seed message {i}',
+                    timestamp=now - timedelta(minutes=i * 7),
+                    status='unread' if i % 10 == 0 else 'read',
+                )
+                for i in range(200)
+            ], batch_size=500)
+
+        # Enough rows and fresh statistics that the planner prefers indexes
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user_profile = profiles[len(profiles) // 2]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexed(self, run):
+        """Run a callable and check the plan of every query it sends for the message table"""
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        statements = [query['sql'] for query in queries.captured_queries if 'messaging_message' in query['sql']]
+        self.assertTrue(statements)
+
+        for sql in statements:
+            for line in self.explain(sql):
+                with self.subTest(sql=sql, plan=line):
+                    self.assertFalse(any(marker in line for marker in BAD_PLAN_MARKERS))
+                    # "SCAN messaging_message" without an index is a full table scan
+                    self.assertFalse(line.startswith('SCAN messaging_message') and 'INDEX' not in line)
+
+    def test_dashboard_mark_read(self):
+        self.assertIndexed(lambda: self.user_profile.messages.filter(status='unread').update(status='read'))
+
+    def test_dashboard_stats(self):
+        self.assertIndexed(lambda: recompute_stats(self.user_profile))
+
+    def test_dashboard_first_page(self):
+        self.assertIndexed(lambda: get_message_page(self.user_profile))
+
+    def test_dashboard_later_page(self):
+        _, cursor = get_message_page(self.user_profile)
+        self.assertIndexed(lambda: get_message_page(self.user_profile, before=decode_cursor(cursor)))
+
+    def test_message_image_lookup(self):
+        message = self.user_profile.messages.order_by('-timestamp', '-id')[5]
+        self.assertIndexed(lambda: Message.objects.get(id=message.id, user=self.user_profile))
+
+    def test_archive_messages(self):
+        cutoff = timezone.now() - timedelta(hours=12)
+        self.assertIndexed(lambda: archive_user_messages(self.user_profile, cutoff, batch_size=50))
+
+    def test_export_pages(self):
+        rows = self.user_profile.messages.values_list('id', 'message_text')
+        self.assertIndexed(lambda: list(iter_by_id(rows, 50, descending=True)))
+
+    def test_message_export(self):
+        self.assertIndexed(lambda: list(iter_export_messages(self.user_profile, chunk_size=50)))
+
+    def test_delete_all_messages(self):
+        last_id = self.user_profile.messages.order_by('-id').values_list('id', flat=True)[0]
+        self.assertIndexed(lambda: delete_messages_in_chunks(self.user_profile.id, last_id, chunk_size=50))
+
+
+class MessageImageConditionalTests(TestCase):
+    """generate_message_image answers If-None-Match like any other conditional GET"""
+
+    def setUp(self):
+        user_profile = UserProfile.objects.create(username='imagetest', pin='0000')
+        self.message = Message.objects.create(user=user_profile, message_text='Hello there')
+        self.url = reverse('generate_message_image', args=['imagetest', self.message.id])
+        session = self.client.session
+        session['auth_imagetest'] = True
+        session.save()
+        self.etag = self.client.get(self.url, secure=True)['ETag']
+
+    def get(self, if_none_match):
+        return self.client.get(self.url, secure=True, HTTP_IF_NONE_MATCH=if_none_match)
+
+    def test_matching_tags(self):
+        for header in [self.etag, f'W/{self.etag}', '*', f'"other", {self.etag}']:
+            with self.subTest(header=header):
+                self.assertEqual(self.get(header).status_code, 304)
+
+    def test_tag_containing_the_etag(self):
+        response = self.get(self.etag[:-1] + '-longer"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+
+
+@override_settings(FLOOD_DUPLICATE_LIMIT=3, FLOOD_WINDOW_SIZE=50, FLOOD_WINDOW_SECONDS=600)
+class FloodWindowTests(SimpleTestCase):
+    """The flood window is shared by every worker and updated atomically"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'flood.sqlite3')
+        self.signature = minhash_signature('Buy followers now at example dot com')
+
+    def test_window_is_shared_between_workers(self):
+        # One store per simulated worker process, all on the same file
+        workers = [FloodWindowStore(self.path) for _ in range(4)]
+        results = [worker.check(1, self.signature) for worker in workers]
+        self.assertEqual(results, [False, False, False, True])
+        self.assertFalse(workers[0].check(2, self.signature))
+
+    def test_concurrent_checks_admit_the_limit(self):
+        def check(_):
+            return FloodWindowStore(self.path).check(1, self.signature)
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(check, range(16)))
+        self.assertEqual(results.count(False), 3)
+
+    def test_window_expires(self):
+        store = FloodWindowStore(self.path)
+        for _ in range(3):
+            store.check(1, self.signature, now=1000)
+        self.assertTrue(store.check(1, self.signature, now=1500))
+        self.assertFalse(store.check(1, self.signature, now=1700))
+
+
+class MessageRowDeletionTests(TestCase):
+    """delete_message_rows skips what QuerySet.delete() would do, so it must have nothing to skip"""
+
+    def test_message_delete_has_no_side_effects(self):
+        self.assertEqual(Message._meta.related_objects, ())
+        self.assertFalse(pre_delete.has_listeners(Message))
+        self.assertFalse(post_delete.has_listeners(Message))
+
+    def test_deletes_matching_rows(self):
+        user_profile = UserProfile.objects.create(username='rowdelete', pin='0000')
+        messages = Message.objects.bulk_create([
+            Message(user=user_profile, message_text=f'Row {i}') for i in range(5)
+        ])
+        self.assertEqual(delete_message_rows(Message.objects.filter(id__in=[m.id for m in messages[:3]])), 3)
+        self.assertEqual(user_profile.messages.count(), 2)
+
+
+class ShareCardExportTests(TestCase):
+    """The bulk share card export covers archived messages too"""
+
+    def test_archived_messages_follow_the_inbox(self):
+        user_profile = UserProfile.objects.create(username='cardexport', pin='0000')
+        now = timezone.now()
+        messages = Message.objects.bulk_create([
+            Message(user=user_profile, message_text=f'Card {i}', timestamp=now - timedelta(days=10 - i))
+            for i in range(10)
+        ])
+        archive_user_messages(user_profile, now - timedelta(days=5), batch_size=2)
+
+        ids = [message_id for message_id, _ in _iter_card_messages(user_profile, chunk_size=2)]
+        self.assertEqual(ids, [message.id for message in reversed(messages)])
+
+
+class MessageExportTests(TestCase):
+    """The inbox export pages through the inbox in short queries"""
+
+    def test_export_order_and_transactions(self):
+        user_profile = UserProfile.objects.create(username='export', pin='0000')
+        now = timezone.now()
+        # Equal timestamps across chunk boundaries, a late insert out of id
+        # order, and two archived messages
+        messages = Message.objects.bulk_create([
+            Message(user=user_profile, message_text=f'Export {i}', timestamp=now - timedelta(minutes=i // 3))
+            for i in range(12)
+        ] + [
+            Message(user=user_profile, message_text='Late', timestamp=now - timedelta(minutes=10)),
+            Message(user=user_profile, message_text='Old', timestamp=now - timedelta(hours=2)),
+            Message(user=user_profile, message_text='Older', timestamp=now - timedelta(hours=3)),
+        ])
+        archive_user_messages(user_profile, now - timedelta(hours=1))
+
+        expected = sorted(messages[:13], key=lambda m: (m.timestamp, m.id), reverse=True) + messages[13:]
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(iter_export_messages(user_profile, chunk_size=4))
+
+        self.assertEqual([row[0] for row in rows], [message.id for message in expected])
+        self.assertFalse([query for query in queries.captured_queries if 'SAVEPOINT' in query['sql']])
+
+
+# The manifest only exists after collectstatic
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class AdminChangelistQueryTests(TestCase):
+    """Admin changelists run the same number of queries however many rows a page shows"""
+
+    PROFILES = 10
+
+    PAGES = [
+        ('admin:messaging_userprofile_changelist', ''),
+        ('admin:messaging_userprofile_changelist', '?o=4'),
+        ('admin:messaging_userprofile_changelist', '?q=admincheck'),
+        ('admin:messaging_message_changelist', ''),
+        ('admin:messaging_message_changelist', '?q=admincheck'),
+        ('admin:messaging_message_changelist', '?status__exact=unread'),
+    ]
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admincheck_root', password=None))
+        # Loads the session and warms per-process caches
+        self.client.get(reverse('admin:index'), secure=True)
+
+    def seed(self, start, stop):
+        """Profiles admincheck_<start>..<stop>, each with two messages and stats"""
+        profiles = UserProfile.objects.bulk_create([
+            UserProfile(username=f'admincheck_{i}', pin='0000') for i in range(start, stop)
+        ])
+        Message.objects.bulk_create([
+            Message(user=user_profile, message_text=f'Admin check message {i}', status=status)
+            for user_profile in profiles
+            for i, status in enumerate(['unread', 'read'])
+        ])
+        for user_profile in profiles:
+            recompute_stats(user_profile)
+
+    def get(self, url):
+        response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_does_not_grow_with_rows(self):
+        urls = [reverse(name) + query for name, query in self.PAGES]
+
+        self.seed(0, self.PROFILES)
+        counts = {}
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.get(url)
+            counts[url] = len(queries.captured_queries)
+
+        self.seed(self.PROFILES, self.PROFILES * 10)
+        for url in urls:
+            with self.subTest(url=url), self.assertNumQueries(counts[url]):
+                self.get(url)
@@ -1,21 +1,37 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Under ASGI the public endpoints run as async views
+if settings.ASYNC_VIEWS:
+    public_profile_view, send_message_view = views.public_profile_async, views.send_message_async
+else:
+    public_profile_view, send_message_view = views.public_profile, views.send_message_ajax
+
 urlpatterns = [
     # Homepage
     path('', views.index, name='index'),
     path('profile-created/', views.profile_created, name='profile_created'),
     path('login/', views.login, name='login'),
+    path('csrf/', views.get_csrf_token, name='get_csrf_token'),
+    path('username-available/', views.username_availability, name='username_availability'),
     
     # Public profile
-    path('u/<str:username>/', views.public_profile, name='public_profile'),
-    path('u/<str:username>/send/', views.send_message_ajax, name='send_message_ajax'),
+    path('u/<str:username>/', public_profile_view, name='public_profile'),
+    path('u/<str:username>/send/', send_message_view, name='send_message_ajax'),
     
     # Dashboard
     path('dashboard/<str:username>/', views.dashboard, name='dashboard'),
     path('dashboard/<str:username>/auth/', views.dashboard_auth, name='dashboard_auth'),
+    path('dashboard/<str:username>/messages/', views.dashboard_messages, name='dashboard_messages'),
+    path('dashboard/<str:username>/search/', views.dashboard_search, name='dashboard_search'),
+    path('dashboard/<str:username>/archive/', views.dashboard_archive, name='dashboard_archive'),
+    path('dashboard/<str:username>/stream/', views.dashboard_stream, name='dashboard_stream'),
     path('dashboard/<str:username>/logout/', views.logout_dashboard, name='logout_dashboard'),
     path('dashboard/<str:username>/delete/<int:message_id>/', views.delete_message, name='delete_message'),
     path('dashboard/<str:username>/delete-all/', views.delete_all_messages, name='delete_all_messages'),
+    path('dashboard/<str:username>/delete-all/status/', views.delete_all_status, name='delete_all_status'),
     path('dashboard/<str:username>/message-image/<int:message_id>/', views.generate_message_image, name='generate_message_image'),
+    path('dashboard/<str:username>/export/', views.export_messages, name='export_messages'),
+    path('dashboard/<str:username>/export-images/', views.export_message_images, name='export_message_images'),
 ]
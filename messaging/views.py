@@ -1,17 +1,39 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
 from django.views.decorators.http import require_http_methods
+from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.conf import settings
+from django.urls import reverse
+from django.core.cache import cache
 from django.contrib import messages
-from django.db.models import Count, Q
-from django.utils import timezone
-from datetime import timedelta
-from django_ratelimit.decorators import ratelimit
-from .models import UserProfile, Message, BlockedIP
+from django.db import IntegrityError, transaction
+import hashlib
+from .models import UserProfile, Message
 from .forms import CreateProfileForm, SendMessageForm, PinAuthForm, LoginForm
-from PIL import Image, ImageDraw, ImageFont
-import io
-import textwrap
+from .archive import count_archived_messages, get_archive_page, decode_archive_cursor
+from .availability import check_username
+from .blocklist import is_ip_address_blocked, ais_ip_address_blocked
+from .cards import render_card
+from .deletion import delete_inbox, start_inbox_deletion, is_stale
+from .exports import EXPORT_FORMATS, stream_share_cards_zip, stream_messages_export, streaming_download
+from .flood import check_flood
+from .image_cache import share_image_key, get_share_image_cache
+from .ingest import submit_message, asubmit_message, wake_flusher
+from .live import inbox_event_stream, run_read
+from .lockout import get_lockout, record_pin_failure, clear_pin_failures, lockout_response
+from .pagination import get_message_page, get_messages_since, decode_cursor, serialize_message
+from .profiles import get_profile_or_404, aget_profile_or_404
+from .ratelimit import ratelimit
+from .search import search_messages, parse_terms
+from .stats import (
+    get_profile_stats, summarize_stats,
+    record_message_deleted, mark_all_read,
+)
 
 
 def get_client_ip(request):
@@ -25,9 +47,8 @@ def get_client_ip(request):
 
 
 def is_ip_blocked(ip_address):
-    """Check if IP is blocked"""
-    ip_hash = Message.hash_ip(ip_address)
-    return BlockedIP.objects.filter(ip_hash=ip_hash).exists()
+    """Check if IP (or one of its network prefixes) is blocked"""
+    return is_ip_address_blocked(ip_address)
 
 
 def index(request):
@@ -39,22 +60,34 @@ def index(request):
             pin = UserProfile.generate_pin()
             
             # Create user profile
-            user_profile = UserProfile.objects.create(
-                username=username,
-                pin=pin
-            )
-            
-            # Store in session
-            request.session['created_username'] = username
-            request.session['created_pin'] = pin
-            
-            return redirect('profile_created')
+            try:
+                with transaction.atomic():
+                    user_profile = UserProfile.objects.create(
+                        username=username,
+                        pin=pin
+                    )
+            except IntegrityError:
+                # Taken by another signup since the form was validated
+                form.add_error('username', 'This username is already taken. Please choose another.')
+            else:
+                # Store in session
+                request.session['created_username'] = username
+                request.session['created_pin'] = pin
+                
+                return redirect('profile_created')
     else:
         form = CreateProfileForm()
     
     return render(request, 'messaging/index.html', {'form': form})
 
 
+@ratelimit(key='ip', rate='120/m', method='GET')
+@require_http_methods(["GET"])
+def username_availability(request):
+    """JSON endpoint for the signup form: is ?username= free, and if not, what is"""
+    return JsonResponse(dict(check_username(request.GET.get('username', '')[:100]), success=True))
+
+
 def profile_created(request):
     """Show created profile details with PIN"""
     username = request.session.get('created_username')
@@ -63,7 +96,7 @@ def profile_created(request):
     if not username or not pin:
         return redirect('index')
     
-    user_profile = get_object_or_404(UserProfile, username=username)
+    user_profile = get_profile_or_404(username)
     
     # Clear session after showing once
     if request.GET.get('clear') == '1':
@@ -82,19 +115,83 @@ def profile_created(request):
 
 def public_profile(request, username):
     """Public profile page where anyone can send anonymous messages"""
-    user_profile = get_object_or_404(UserProfile, username=username)
+    user_profile = get_profile_or_404(username)
     
     if request.method == 'POST':
         return send_message_ajax(request, username)
     
+    # The page is identical for every visitor (the CSRF token is fetched by
+    # JS), so the rendered HTML is cached and served with validators
+    cache_key = _public_page_key(request, user_profile)
+    content = cache.get(cache_key)
+    if content is None:
+        content = _render_public_page(request, user_profile)
+        cache.set(cache_key, content, settings.PUBLIC_PROFILE_CACHE_TIMEOUT)
+    
+    return _public_page_response(request, content)
+
+
+async def public_profile_async(request, username):
+    """Async version of public_profile for ASGI deployments"""
+    user_profile = await aget_profile_or_404(username)
+    
+    if request.method == 'POST':
+        return await send_message_async(request, username)
+    
+    cache_key = _public_page_key(request, user_profile)
+    content = await cache.aget(cache_key)
+    if content is None:
+        content = await sync_to_async(_render_public_page)(request, user_profile)
+        await cache.aset(cache_key, content, settings.PUBLIC_PROFILE_CACHE_TIMEOUT)
+    
+    return _public_page_response(request, content)
+
+
+def _public_page_url(request):
+    # The query string is left out: any ?x=N would otherwise be a new cache
+    # entry, evicting the profile and version keys from the cache
+    return request.build_absolute_uri(request.path)
+
+
+def _public_page_key(request, user_profile):
+    return 'public_page:' + hashlib.sha256(
+        f"{user_profile.id}:{_public_page_url(request)}".encode()
+    ).hexdigest()
+
+
+def _render_public_page(request, user_profile):
     form = SendMessageForm()
     
     context = {
         'user_profile': user_profile,
         'form': form,
+        'page_url': _public_page_url(request),
     }
     
-    return render(request, 'messaging/public_send.html', context)
+    return render(request, 'messaging/public_send.html', context).content
+
+
+def _public_page_response(request, content):
+    response = HttpResponse(content)
+    response['ETag'] = f'"{hashlib.sha256(content).hexdigest()}"'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    
+    # The page never touches the session, but SessionMiddleware still
+    # deletes an invalid or expired session cookie on the response, and a
+    # shared cache must never store a Set-Cookie
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        response['Cache-Control'] = 'private, max-age=0'
+    else:
+        response['Cache-Control'] = f'public, max-age=60, s-maxage={settings.PUBLIC_PROFILE_CACHE_TIMEOUT}'
+    
+    return get_conditional_response(request, etag=response['ETag'], response=response)
+
+
+@never_cache
+@require_http_methods(["GET"])
+def get_csrf_token(request):
+    """Hand out a CSRF token (and cookie) to cached pages before they POST"""
+    return JsonResponse({'csrfToken': get_token(request)})
 
 
 @ratelimit(key='ip', rate='5/m', method='POST')
@@ -117,35 +214,86 @@ def send_message_ajax(request, username):
             'error': 'Your IP has been blocked due to spam.'
         }, status=403)
     
-    user_profile = get_object_or_404(UserProfile, username=username)
-    form = SendMessageForm(request.POST)
+    user_profile = get_profile_or_404(username)
+    message_text, error_response = _clean_message(request, user_profile)
+    if error_response is not None:
+        return error_response
     
-    if form.is_valid():
-        message_text = form.cleaned_data['message_text']
-        
-        # Create message
-        message = Message.objects.create(
-            user=user_profile,
-            message_text=message_text,
-            sender_ip_hash=Message.hash_ip(ip_address)
-        )
-        
+    # Create message (directly, or via the write-behind queue)
+    submit_message(user_profile, message_text, Message.hash_ip(ip_address))
+    
+    return JsonResponse({
+        'success': True,
+        'message': 'Your anonymous message has been sent! 🎉'
+    })
+
+
+@ratelimit(key='ip', rate='5/m', method='POST')
+async def send_message_async(request, username):
+    """Async version of send_message_ajax for ASGI deployments"""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    
+    if getattr(request, 'limited', False):
         return JsonResponse({
-            'success': True,
-            'message': 'Your anonymous message has been sent! 🎉'
-        })
-    else:
-        errors = form.errors.as_json()
+            'success': False,
+            'error': 'Too many messages. Please wait a moment.'
+        }, status=429)
+    
+    ip_address = get_client_ip(request)
+    if await ais_ip_address_blocked(ip_address):
         return JsonResponse({
+            'success': False,
+            'error': 'Your IP has been blocked due to spam.'
+        }, status=403)
+    
+    user_profile = await aget_profile_or_404(username)
+    # Validation can reload the spam words through the sync ORM
+    message_text, error_response = await sync_to_async(_clean_message)(request, user_profile)
+    if error_response is not None:
+        return error_response
+    
+    await asubmit_message(user_profile, message_text, Message.hash_ip(ip_address))
+    
+    return JsonResponse({
+        'success': True,
+        'message': 'Your anonymous message has been sent! 🎉'
+    })
+
+
+def _clean_message(request, user_profile):
+    """Validate a submitted message; returns (message_text, error_response)"""
+    form = SendMessageForm(request.POST)
+    
+    if not form.is_valid():
+        errors = form.errors.as_json()
+        return None, JsonResponse({
             'success': False,
             'error': 'Please check your message and try again.',
             'errors': errors
         }, status=400)
+    
+    message_text = form.cleaned_data['message_text']
+    
+    # Reject copy-paste floods before they reach the inbox
+    if check_flood(user_profile.id, message_text):
+        return None, JsonResponse({
+            'success': False,
+            'error': 'This message is too similar to ones this user just received.'
+        }, status=429)
+    
+    return message_text, None
 
 
 def dashboard_auth(request, username):
     """PIN authentication for dashboard access"""
-    user_profile = get_object_or_404(UserProfile, username=username)
+    # Locked-out guesses are turned away before any query or session access
+    if request.method == 'POST':
+        retry_after = get_lockout(username, get_client_ip(request))
+        if retry_after:
+            return lockout_response(retry_after)
+    
+    user_profile = get_profile_or_404(username)
     
     # Check if already authenticated
     if request.session.get(f'auth_{username}') == True:
@@ -157,10 +305,12 @@ def dashboard_auth(request, username):
             pin = form.cleaned_data['pin']
             
             if pin == user_profile.pin:
+                clear_pin_failures(username)
                 # Set session
                 request.session[f'auth_{username}'] = True
                 return redirect('dashboard', username=username)
             else:
+                record_pin_failure(username, get_client_ip(request))
                 messages.error(request, 'Incorrect PIN. Please try again.')
     else:
         form = PinAuthForm()
@@ -175,43 +325,174 @@ def dashboard_auth(request, username):
 
 def dashboard(request, username):
     """User dashboard - view messages"""
-    user_profile = get_object_or_404(UserProfile, username=username)
+    user_profile = get_profile_or_404(username)
     
     # Check authentication
     if not request.session.get(f'auth_{username}'):
         return redirect('dashboard_auth', username=username)
     
-    # Get messages
-    messages_list = user_profile.messages.all()
+    # Queued messages show up through the live updates once written
+    wake_flusher()
     
-    # Mark all as read
-    messages_list.filter(status='unread').update(status='read')
+    # Analytics come from the maintained counters instead of scanning messages
+    stats = summarize_stats(get_profile_stats(user_profile))
     
-    # Analytics
-    total_messages = messages_list.count()
-    today = timezone.now().date()
-    today_messages = messages_list.filter(timestamp__date=today).count()
+    # Mark all as read (skipped when the counters say there is nothing unread)
+    if stats['unread_messages']:
+        mark_all_read(user_profile)
     
-    # Last 7 days messages
-    week_ago = timezone.now() - timedelta(days=7)
-    week_messages = messages_list.filter(timestamp__gte=week_ago).count()
+    # Only the first page is rendered; older messages are fetched on scroll
+    first_page, next_cursor = get_message_page(user_profile)
     
     context = {
         'user_profile': user_profile,
-        'messages': messages_list,
-        'total_messages': total_messages,
-        'today_messages': today_messages,
-        'week_messages': week_messages,
+        'messages': first_page,
+        'next_cursor': next_cursor,
+        'latest_message_id': max((message.id for message in first_page), default=0),
+        'total_messages': stats['total_messages'],
+        'today_messages': stats['today_messages'],
+        'week_messages': stats['week_messages'],
+        'archived_messages': count_archived_messages(user_profile),
         'profile_url': request.build_absolute_uri(user_profile.get_profile_url()),
     }
     
     return render(request, 'messaging/dashboard.html', context)
 
 
+@require_http_methods(["GET"])
+def dashboard_messages(request, username):
+    """
+    JSON endpoint for the inbox: ?before=<cursor> returns the next slice for
+    infinite scroll, ?since=<id> returns only messages newer than that id
+    plus the current counters (polling fallback for live updates)
+    """
+    user_profile = get_profile_or_404(username)
+    
+    # Check authentication
+    if not request.session.get(f'auth_{username}'):
+        return JsonResponse({'success': False, 'error': 'Not authenticated'}, status=403)
+    
+    if 'since' in request.GET:
+        try:
+            since_id = int(request.GET['since'])
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Invalid message id'}, status=400)
+        
+        wake_flusher()
+        new_messages, has_more = get_messages_since(user_profile, since_id)
+        
+        return JsonResponse({
+            'success': True,
+            'messages': [serialize_message(message) for message in new_messages],
+            'has_more': has_more,
+            'stats': summarize_stats(get_profile_stats(user_profile)),
+        })
+    
+    before = None
+    if request.GET.get('before'):
+        before = decode_cursor(request.GET['before'])
+        if before is None:
+            return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+    
+    page, next_cursor = get_message_page(user_profile, before=before)
+    
+    return JsonResponse({
+        'success': True,
+        'messages': [serialize_message(message) for message in page],
+        'next_cursor': next_cursor,
+    })
+
+
+@require_http_methods(["GET"])
+def dashboard_search(request, username):
+    """JSON endpoint for inbox search: ?q=<words>&page=<n>, best matches first"""
+    user_profile = get_profile_or_404(username)
+    
+    # Check authentication
+    if not request.session.get(f'auth_{username}'):
+        return JsonResponse({'success': False, 'error': 'Not authenticated'}, status=403)
+    
+    query = request.GET.get('q', '')[:200]
+    if not parse_terms(query):
+        return JsonResponse({'success': False, 'error': 'Enter a word to search for'}, status=400)
+    
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 0
+    if page < 1:
+        return JsonResponse({'success': False, 'error': 'Invalid page'}, status=400)
+    
+    # Queued messages become searchable once they are stored
+    wake_flusher()
+    results, has_next = search_messages(user_profile, query, page=page)
+    
+    return JsonResponse({
+        'success': True,
+        'messages': [serialize_message(message) for message in results],
+        'next_page': page + 1 if has_next else None,
+    })
+
+
+@require_http_methods(["GET"])
+def dashboard_archive(request, username):
+    """JSON endpoint for archived messages: ?before=<cursor> returns the next (older) slice"""
+    user_profile = get_profile_or_404(username)
+    
+    # Check authentication
+    if not request.session.get(f'auth_{username}'):
+        return JsonResponse({'success': False, 'error': 'Not authenticated'}, status=403)
+    
+    before = None
+    if request.GET.get('before'):
+        before = decode_archive_cursor(request.GET['before'])
+        if before is None:
+            return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+    
+    page, next_cursor = get_archive_page(user_profile, before=before)
+    
+    return JsonResponse({
+        'success': True,
+        'messages': [dict(serialize_message(message), archived=True) for message in page],
+        'next_cursor': next_cursor,
+    })
+
+
+async def dashboard_stream(request, username):
+    """Server-sent events stream of new messages and counters (ASGI only)"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    
+    # Off the request's thread, which would otherwise keep the database
+    # connection for as long as the stream stays open
+    user_profile = await run_read(get_profile_or_404, username)
+    
+    # Check authentication
+    if not await run_read(request.session.get, f'auth_{username}'):
+        return JsonResponse({'success': False, 'error': 'Not authenticated'}, status=403)
+    
+    # A sync worker would have to hold a whole process per open stream;
+    # dashboards fall back to polling ?since=<id> instead
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'success': False, 'error': 'Live updates require ASGI'}, status=501)
+    
+    try:
+        since_id = int(request.headers.get('Last-Event-ID') or request.GET.get('since', 0))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid message id'}, status=400)
+    
+    response = StreamingHttpResponse(
+        inbox_event_stream(user_profile.id, since_id), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @require_http_methods(["POST"])
 def delete_message(request, username, message_id):
     """Delete a single message"""
-    user_profile = get_object_or_404(UserProfile, username=username)
+    user_profile = get_profile_or_404(username)
     
     # Check authentication
     if not request.session.get(f'auth_{username}'):
@@ -219,6 +500,7 @@ def delete_message(request, username, message_id):
     
     message = get_object_or_404(Message, id=message_id, user=user_profile)
     message.delete()
+    record_message_deleted(user_profile, message)
     
     return JsonResponse({'success': True, 'message': 'Message deleted'})
 
@@ -226,18 +508,53 @@ def delete_message(request, username, message_id):
 @require_http_methods(["POST"])
 def delete_all_messages(request, username):
     """Delete all messages"""
-    user_profile = get_object_or_404(UserProfile, username=username)
+    user_profile = get_profile_or_404(username)
     
     # Check authentication
     if not request.session.get(f'auth_{username}'):
         return JsonResponse({'success': False, 'error': 'Not authenticated'}, status=403)
     
-    count = user_profile.messages.count()
-    user_profile.messages.all().delete()
+    # Very large inboxes are deleted in the background while the page polls
+    total = get_profile_stats(user_profile).total_messages
+    if total > settings.BULK_DELETE_BACKGROUND_THRESHOLD:
+        job = start_inbox_deletion(user_profile)
+        return JsonResponse({
+            'success': True,
+            'background': True,
+            'message': f'Deleting {job.total_messages} messages...',
+            'status_url': reverse('delete_all_status', args=[username]),
+        }, status=202)
+    
+    count = delete_inbox(user_profile)
     
     return JsonResponse({'success': True, 'message': f'{count} messages deleted'})
 
 
+@require_http_methods(["GET"])
+def delete_all_status(request, username):
+    """Progress of a background inbox deletion"""
+    user_profile = get_profile_or_404(username)
+    
+    # Check authentication
+    if not request.session.get(f'auth_{username}'):
+        return JsonResponse({'success': False, 'error': 'Not authenticated'}, status=403)
+    
+    job = user_profile.inbox_deletions.first()
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'No deletion in progress'}, status=404)
+    
+    # The worker running it went away (restart or deploy); carry on here
+    if job.status == 'running' and is_stale(job):
+        job = start_inbox_deletion(user_profile)
+    
+    return JsonResponse({
+        'success': True,
+        'status': job.status,
+        'deleted_messages': job.deleted_messages,
+        'total_messages': job.total_messages,
+    })
+
+
 def logout_dashboard(request, username):
     """Logout from dashboard"""
     if f'auth_{username}' in request.session:
@@ -250,6 +567,13 @@ def logout_dashboard(request, username):
 def login(request):
     """Login page for existing users"""
     if request.method == 'POST':
+        client_ip = get_client_ip(request)
+        
+        # Locked-out guesses are turned away before any query or session access
+        retry_after = get_lockout(request.POST.get('username', '').lower().strip(), client_ip)
+        if retry_after:
+            return lockout_response(retry_after)
+        
         form = LoginForm(request.POST)
         if form.is_valid():
             username = form.cleaned_data['username']
@@ -259,13 +583,17 @@ def login(request):
                 user_profile = UserProfile.objects.get(username=username)
                 
                 if pin == user_profile.pin:
+                    clear_pin_failures(username)
                     # Set session
                     request.session[f'auth_{username}'] = True
                     messages.success(request, f'Welcome back, @{username}!')
                     return redirect('dashboard', username=username)
                 else:
+                    record_pin_failure(username, client_ip)
                     messages.error(request, 'Incorrect PIN. Please try again.')
             except UserProfile.DoesNotExist:
+                # Probing for usernames counts against the address only
+                record_pin_failure(username, client_ip, scopes=('ip',))
                 messages.error(request, 'Username not found. Please check and try again.')
     else:
         form = LoginForm()
@@ -275,7 +603,7 @@ def login(request):
 
 def generate_message_image(request, username, message_id):
     """Generate an image for a message to share on social media"""
-    user_profile = get_object_or_404(UserProfile, username=username)
+    user_profile = get_profile_or_404(username)
     
     # Check authentication
     if not request.session.get(f'auth_{username}'):
@@ -283,99 +611,64 @@ def generate_message_image(request, username, message_id):
     
     message = get_object_or_404(Message, id=message_id, user=user_profile)
     
-    # Create image
-    width, height = 1080, 1080
-    bg_color = (88, 101, 242)  # Discord-like blue
-    text_color = (255, 255, 255)
-    accent_color = (255, 255, 255, 50)
+    # Same message text and username always render the same image
+    key = share_image_key(message.message_text, username)
+    etag = f'"{key}"'
+    
+    # Browser already has this exact image (If-None-Match with any list of
+    # tags, weak tags or *); only a miss reads or renders the image
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        cache = get_share_image_cache()
+        image_bytes = cache.get(key)
+        if image_bytes is None:
+            image_bytes = render_card(message.message_text, username)
+            cache.set(key, image_bytes)
+        
+        response = HttpResponse(image_bytes, content_type='image/png')
+        response['Content-Disposition'] = f'inline; filename="message_{message_id}.png"'
     
-    # Create image with gradient-like background
-    img = Image.new('RGB', (width, height), bg_color)
-    draw = ImageDraw.Draw(img, 'RGBA')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+
+@require_http_methods(["GET"])
+def export_message_images(request, username):
+    """Download a ZIP with a share image for every message"""
+    user_profile = get_profile_or_404(username)
     
-    # Add decorative elements
-    draw.ellipse([width-300, -150, width+150, 300], fill=accent_color)
-    draw.ellipse([-150, height-300, 300, height+150], fill=accent_color)
+    # Check authentication
+    if not request.session.get(f'auth_{username}'):
+        return HttpResponse('Unauthorized', status=403)
     
-    # Try to use fonts, with multiple fallbacks - using extremely large, highly visible sizes
-    try:
-        # Try Windows fonts with extremely large sizes
-        title_font = ImageFont.truetype("arial.ttf", 110)
-        message_font = ImageFont.truetype("arialbd.ttf", 95)  # Bold for better readability
-        footer_font = ImageFont.truetype("arial.ttf", 60)
-        small_font = ImageFont.truetype("arial.ttf", 48)
-    except:
-        try:
-            # Try alternative Windows fonts with extremely large sizes
-            title_font = ImageFont.truetype("C:\\Windows\\Fonts\\arial.ttf", 110)
-            message_font = ImageFont.truetype("C:\\Windows\\Fonts\\arialbd.ttf", 95)
-            footer_font = ImageFont.truetype("C:\\Windows\\Fonts\\arial.ttf", 60)
-            small_font = ImageFont.truetype("C:\\Windows\\Fonts\\arial.ttf", 48)
-        except:
-            try:
-                # Try Linux fonts with extremely large sizes
-                title_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 110)
-                message_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 95)
-                footer_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 60)
-                small_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 48)
-            except:
-                # Use default font as last resort
-                title_font = ImageFont.load_default()
-                message_font = ImageFont.load_default()
-                footer_font = ImageFont.load_default()
-                small_font = ImageFont.load_default()
-    
-    # Add title
-    title_text = "📨 Anonymous Message"
-    try:
-        title_bbox = draw.textbbox((0, 0), title_text, font=title_font)
-        title_width = title_bbox[2] - title_bbox[0]
-        draw.text(((width - title_width) // 2, 100), title_text, fill=text_color, font=title_font)
-    except:
-        # Fallback without emoji
-        title_text = "Anonymous Message"
-        title_bbox = draw.textbbox((0, 0), title_text, font=title_font)
-        title_width = title_bbox[2] - title_bbox[0]
-        draw.text(((width - title_width) // 2, 100), title_text, fill=text_color, font=title_font)
-    
-    # Add decorative line
-    draw.rectangle([width//2 - 200, 250, width//2 + 200, 265], fill=text_color)
-    
-    # Wrap and add message text - adjusted for extremely large font
-    max_chars = 18  # Very short lines for extremely large font
-    wrapped_lines = textwrap.wrap(message.message_text, width=max_chars)
-    
-    # Limit to 6 lines for extremely large font
-    if len(wrapped_lines) > 6:
-        wrapped_lines = wrapped_lines[:6]
-        wrapped_lines[-1] = wrapped_lines[-1][:max_chars-3] + "..."
-    
-    y_offset = 380
-    line_height = 110  # Extra large spacing for extremely large text
-    
-    for line in wrapped_lines:
-        line_bbox = draw.textbbox((0, 0), line, font=message_font)
-        line_width = line_bbox[2] - line_bbox[0]
-        draw.text(((width - line_width) // 2, y_offset), line, fill=text_color, font=message_font)
-        y_offset += line_height
-    
-    # Add footer
-    footer_text = f"Sent to @{username}"
-    footer_bbox = draw.textbbox((0, 0), footer_text, font=footer_font)
-    footer_width = footer_bbox[2] - footer_bbox[0]
-    draw.text(((width - footer_width) // 2, height - 200), footer_text, fill=text_color, font=footer_font)
-    
-    # Add website/call to action
-    cta_text = "Send me anonymous messages!"
-    cta_bbox = draw.textbbox((0, 0), cta_text, font=small_font)
-    cta_width = cta_bbox[2] - cta_bbox[0]
-    draw.text(((width - cta_width) // 2, height - 100), cta_text, fill=(255, 255, 255, 200), font=small_font)
-    
-    # Save to bytes
-    img_io = io.BytesIO()
-    img.save(img_io, 'PNG', quality=95)
-    img_io.seek(0)
-    
-    response = HttpResponse(img_io, content_type='image/png')
-    response['Content-Disposition'] = f'inline; filename="message_{message_id}.png"'
-    return response
+    return streaming_download(
+        request, stream_share_cards_zip(user_profile), 'application/zip', f'{username}_messages.zip'
+    )
+
+
+@require_http_methods(["GET"])
+def export_messages(request, username):
+    """Download every message as CSV (default) or JSON Lines: ?format=csv|jsonl&gzip=1"""
+    user_profile = get_profile_or_404(username)
+    
+    # Check authentication
+    if not request.session.get(f'auth_{username}'):
+        return HttpResponse('Unauthorized', status=403)
+    
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponse('Unknown export format', status=400)
+    compress = request.GET.get('gzip') == '1'
+    
+    # Messages still queued are written in the background and left out
+    wake_flusher()
+    
+    content_type, extension = EXPORT_FORMATS[export_format]
+    filename = f'{username}_messages.{extension}'
+    if compress:
+        content_type, filename = 'application/gzip', f'{filename}.gz'
+    
+    return streaming_download(
+        request, stream_messages_export(user_profile, export_format, compress), content_type, filename
+    )
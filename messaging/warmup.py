@@ -0,0 +1,133 @@
+"""
+Warm-up run before a worker accepts traffic.
+
+Without it every worker pays on its first real request for the lazy parts
+of the stack: importing the views, building the URL resolver, compiling
+templates, Pillow's plugin registry, font discovery, the database
+connection and the blocklist, spam word and username snapshots.
+
+The work is split in two. warm_up_process needs no database and runs in the
+gunicorn master when the app is preloaded, so forked workers inherit it.
+warm_up_worker runs in each worker and adds the per-process state that must
+not cross a fork.
+"""
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.db import connection
+from django.template.loader import get_template
+from django.urls import get_resolver
+from io import BytesIO
+from pathlib import Path
+from PIL import Image
+import importlib
+import sys
+import threading
+from . import cards
+from .availability import get_username_filter
+from .blocklist import get_blocklist
+from .forms import CreateProfileForm, SendMessageForm, PinAuthForm, LoginForm
+from .spam import get_spam_matcher
+
+
+# Modules the URLconf does not import until the first request needs them
+HOT_MODULES = [
+    'messaging.views',
+    'messaging.admin',
+    'messaging.exports',
+]
+
+
+def iter_template_names():
+    """Names of every template in the project's template directories"""
+    for directory in settings.TEMPLATES[0]['DIRS']:
+        directory = Path(directory)
+        for path in sorted(directory.rglob('*.html')):
+            yield path.relative_to(directory).as_posix()
+
+
+def warm_up_process():
+    """Warm everything that is safe to share across fork (no connections)"""
+    for module in HOT_MODULES:
+        importlib.import_module(module)
+
+    # Populates the resolver's reverse lookups, also used by {% url %}
+    get_resolver().reverse_dict
+
+    # The cached template loader keeps the compiled templates
+    for name in iter_template_names():
+        get_template(name)
+
+    # Form widgets render through templates of their own
+    for form_class in (CreateProfileForm, SendMessageForm, PinAuthForm, LoginForm):
+        str(form_class())
+
+    # {% static %} sets up the storage (and reads its manifest) on first use
+    staticfiles_storage.base_url
+
+    Image.preinit()
+    cards.warm_up()
+
+
+def warm_up_worker():
+    """Warm one worker: the shared part (a no-op if inherited) plus the database"""
+    warm_up_process()
+
+    # Persistent connections (CONN_MAX_AGE) are kept for the first request
+    # of a sync worker; threaded workers use warm_up_thread_pool as well
+    connection.ensure_connection()
+    get_blocklist()
+    get_spam_matcher()
+    get_username_filter()
+
+
+def warm_up_thread_pool(executor, size, timeout=30):
+    """
+    Open the database connection of every thread in a request thread pool.
+
+    Connections are per thread, so the one opened by warm_up_worker is
+    never used by a gthread worker's requests. The calls meet at a barrier,
+    which makes the executor start all of its threads instead of reusing
+    the first idle one. The calling thread's connection is closed after.
+    """
+    barrier = threading.Barrier(size)
+
+    def connect():
+        barrier.wait(timeout)
+        connection.ensure_connection()
+
+    try:
+        for future in [executor.submit(connect) for _ in range(size)]:
+            future.result(timeout)
+    finally:
+        connection.close()
+
+
+def warm_up_request(application, path='/'):
+    """
+    Send one GET through a WSGI application and discard the response.
+
+    Covers what only a real request touches: middleware, context
+    processors and lazily imported request-time modules.
+    """
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*']
+    host = hosts[0].lstrip('.') if hosts and '*' not in settings.ALLOWED_HOSTS else 'localhost'
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': host,
+        'SERVER_PORT': '443',
+        'HTTP_HOST': host,
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr,
+        # https, so SECURE_SSL_REDIRECT does not turn this into a redirect
+        'wsgi.url_scheme': 'https',
+    }
+    response = application(environ, lambda status, headers, exc_info=None: None)
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
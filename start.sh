@@ -11,9 +11,6 @@ python manage.py collectstatic --noinput
 echo "Applying database migrations..."
 python manage.py migrate --noinput
 
-# Start Gunicorn
-exec gunicorn anonymous_msg.wsgi:application \
-    --bind 0.0.0.0:${PORT:-8000} \
-    --workers 3 \
-    --timeout 120 \
-    --log-level=info
+# Start Gunicorn (workers, threads, preloading and warm-up are configured
+# in anonymous_msg/gunicorn_conf.py; ASGI=1 switches to uvicorn workers)
+exec gunicorn --config python:anonymous_msg.gunicorn_conf